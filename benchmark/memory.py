@@ -0,0 +1,95 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      benchmark/memory.py
+####
+#### usage:     python benchmark/memory.py [options]
+####
+#### synopsis:  Report peak RSS for loading a large synthetic stock.
+####
+#### description:
+####
+####    Generate the stock, then load it with Stock.fromPath in a fresh
+####    interpreter so that the peak resident set size belongs to loading
+####    alone. Write the results as JSON.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import argparse
+import json
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import synthetic
+
+def _peakRSS():
+    # Linux reports kilobytes, macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure(stockPath):
+    from mupy import design
+    before = _peakRSS()
+    start = time.perf_counter()
+    stock = design.Stock.fromPath(stockPath)
+    seconds = time.perf_counter() - start
+    after = _peakRSS()
+    parts = sum([
+        len(ensemble.parts)
+        for ensembleSet in stock.ensembleSets
+        for ensemble in ensembleSet
+    ])
+    return {
+        'ensembles': sum([len(eS) for eS in stock.ensembleSets]),
+        'parts': parts,
+        'seconds': seconds,
+        'peakRSS': after,
+        'peakRSSBeforeLoad': before,
+        'peakRSSForLoad': after - before,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report peak RSS for loading a large synthetic stock',
+    )
+    parser.add_argument('--ensembles', type=int, default=10000,
+                        help="default='%(default)s'")
+    parser.add_argument('--parts', type=int, default=3,
+                        help="default='%(default)s'")
+    parser.add_argument('--output', help='Write the JSON results to this file')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(pathlib.Path(args.measure))))
+        return
+    parameters = synthetic.DEFAULT._replace(
+        ensembles=args.ensembles, parts=args.parts,
+        shells=0, assets=0, lines=0,
+    )
+    with tempfile.TemporaryDirectory(prefix='mupy-memory-') as directory:
+        stockPath = synthetic.generate(pathlib.Path(directory) / 'stock', parameters)
+        completed = subprocess.run(
+            (sys.executable, __file__, '--measure', str(stockPath)),
+            check=True, text=True, stdout=subprocess.PIPE,
+        )
+    results = {'parameters': parameters._asdict(), **json.loads(completed.stdout)}
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file: file.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      benchmark/stages.py
+####
+#### usage:     python benchmark/stages.py [options]
+####
+#### synopsis:  Time each muPy pipeline stage against a synthetic stock.
+####
+#### description:
+####
+####    Generate a synthetic stock, then time Stock.fromPath, BOM.fromStock,
+####    Kit.fromBOM, Build.fromKit on '@ghost' and TagIndex.max separately.
+####    Write the results as JSON and, given a baseline from an earlier
+####    commit, report the ratio for each stage.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import yaml
+
+from mupy import configuration, design, mupy_host, shell, tag, target, version
+
+import synthetic
+
+def _commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            cwd=pathlib.Path(__file__).parent,
+            check=True, text=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _time(function, repeat, setup=lambda: None):
+    seconds = []
+    result = None
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return result, {
+        'seconds': seconds,
+        'min': min(seconds),
+        'median': statistics.median(seconds),
+    }
+
+def measure(directory, parameters, repeat):
+    stockPath = synthetic.generate(directory / 'stock', parameters)
+    buildPath = directory / 'build'
+    kitPath = buildPath / 'kit' / design.EntryName(synthetic.APP, synthetic.ENTRY)
+    config = configuration.Configuration(
+        directory / 'mupy-host.yaml', yaml.safe_load(mupy_host.YAML),
+    )
+    ghost = target.Target.fromConfiguration(config, 'ghost')
+    tagRay = ghost.tagRay.plus(tag.TagRay.fromString(synthetic.TAGS))
+    sh = shell.Shell.fromDictionary({}, directory)
+    stages = {}
+
+    stock, stages['Stock.fromPath'] = _time(
+        lambda: design.Stock.fromPath(stockPath), repeat,
+    )
+    component = stock.getComponent(synthetic.ENTRY, synthetic.APP, synthetic.ENTRY)
+    bom, stages['BOM.fromStock'] = _time(
+        lambda: design.BOM.fromStock(stock, component), repeat,
+    )
+    kit, stages['Kit.fromBOM'] = _time(
+        lambda: design.Kit.fromBOM(bom, kitPath, tagRay, sh), repeat,
+    )
+    entryName = design.EntryName(synthetic.APP, synthetic.ENTRY)
+    _, stages['Build.fromKit'] = _time(
+        lambda: design.Build.fromKit(kit, buildPath, entryName, ghost), repeat,
+        setup=lambda: shutil.rmtree(buildPath / '.compile', ignore_errors=True),
+    )
+    _, stages['Build.fromKit (cached)'] = _time(
+        lambda: design.Build.fromKit(kit, buildPath, entryName, ghost), repeat,
+    )
+    parts = [
+        part
+        for ensembleSet in stock.ensembleSets
+        for ensemble in ensembleSet
+        for part in ensemble.parts
+    ]
+    queries = [tag.TagRay.fromString(t) for t in ('', '+host', synthetic.TAGS)]
+    def taggedPaths():
+        for part in parts:
+            for query in queries: part.taggedPath(query)
+    _, stages['TagIndex.max'] = _time(taggedPaths, repeat)
+
+    components = []
+    bom.walk(lambda component, _: components.append(component))
+    counts = {
+        'ensembles': sum([len(eS) for eS in stock.ensembleSets]),
+        'parts': len(parts),
+        'components': len(components),
+        'kitFiles': sum([len(fN) for _, _, fN in os.walk(kit.path)]),
+        'tagIndexCalls': len(parts) * len(queries),
+    }
+    return counts, stages
+
+def compare(results, baseline, threshold):
+    isRegression = False
+    print(f'{"stage":<24} {"baseline":>10} {"current":>10} {"ratio":>7}')
+    for name, stage in results['stages'].items():
+        before = baseline['stages'].get(name)
+        if not before:
+            print(f'{name:<24} {"-":>10} {stage["min"]:>10.4f}')
+            continue
+        ratio = stage['min'] / before['min'] if before['min'] else float('inf')
+        flag = ' REGRESSION' if threshold < ratio else ''
+        isRegression = isRegression or bool(flag)
+        print(
+            f'{name:<24} {before["min"]:>10.4f} {stage["min"]:>10.4f}'
+            f' {ratio:>7.2f}{flag}'
+        )
+    return isRegression
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time each muPy pipeline stage against a synthetic stock',
+    )
+    for field, default in synthetic.DEFAULT._asdict().items():
+        parser.add_argument(
+            f'--{field}', type=int, default=default,
+            help="default='%(default)s'",
+        )
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Timings per stage\ndefault='%(default)s'")
+    parser.add_argument('--directory',
+                        help='Work directory, kept afterwards; default is temporary')
+    parser.add_argument('--output', help='Write the JSON results to this file')
+    parser.add_argument('--baseline', help='Compare with earlier JSON results')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Ratio above which a stage regressed\ndefault='%(default)s'")
+    args = parser.parse_args()
+    parameters = synthetic.Parameters(
+        **{field: getattr(args, field) for field in synthetic.Parameters._fields}
+    )
+    with tempfile.TemporaryDirectory(prefix='mupy-benchmark-') as temporary:
+        directory = pathlib.Path(args.directory or temporary).resolve()
+        directory.mkdir(parents=True, exist_ok=True)
+        counts, stages = measure(directory, parameters, args.repeat)
+    results = {
+        'mupy': str(version.VERSION),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'parameters': parameters._asdict(),
+        'repeat': args.repeat,
+        'counts': counts,
+        'stages': stages,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file: file.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as file:
+            if compare(results, json.load(file), args.threshold): sys.exit(1)
+
+if __name__ == '__main__':
+    main()
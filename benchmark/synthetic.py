@@ -0,0 +1,175 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      benchmark/synthetic.py
+####
+#### synopsis:  Generate a synthetic muPy stock for benchmarking.
+####
+#### description:
+####
+####    The generated stock exercises every pipeline stage: many grades
+####    and ensembles, a deep 'uses' chain across imported ensembles,
+####    stacked diamonds, tag-variant paths, shell steps and a large
+####    asset directory. The entry is always 'app^main'.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+from collections import namedtuple
+import pathlib
+import shutil
+
+APP = 'app'
+ENTRY = 'main'
+TAGS = '+host+bench'
+
+Parameters = namedtuple('Parameters', (
+    'grades',       # Number of grade directories, 'A', 'B', ...
+    'ensembles',    # Number of filler ensembles, spread across the grades
+    'parts',        # Parts per filler ensemble
+    'depth',        # Length of the imported 'uses' chain
+    'diamond',      # Number of stacked diamonds
+    'fanout',       # Filler ensembles imported directly by the entry
+    'tagEvery',     # Every n-th filler ensemble has tag-variant paths
+    'shells',       # Parts with a shell step
+    'assets',       # Files in the asset directory part
+    'assetSize',    # Bytes per asset file
+    'lines',        # Functions per generated module
+))
+
+DEFAULT = Parameters(
+    grades=3, ensembles=2000, parts=3, depth=50, diamond=8, fanout=50,
+    tagEvery=4, shells=20, assets=1000, assetSize=256, lines=20,
+)
+
+def gradeName(index):
+    return chr(ord('A') + index)
+
+def ensembleName(index):
+    return f'e{index:05d}'
+
+def partName(index, part):
+    return f'{ensembleName(index)}_{part}'
+
+def _yamlList(names):
+    return '[ %s ]' % ', '.join(['"%s"' % n for n in names]) if names else '[]'
+
+def _source(name, uses, lines):
+    return ''.join([
+        f'"""Synthetic module {name}."""\n',
+        *[f'import {use}\n' for use in uses],
+        f'NAME = {name!r}\n',
+        *[
+            f'\ndef f{line}(x: int) -> int:\n'
+            f'    """Return x offset by {line}."""\n'
+            f'    # Synthetic comment\n'
+            f'    assert isinstance(x, int)\n'
+            f'    return x + {line}\n'
+            for line in range(lines)
+        ],
+    ])
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+def _imports(imports):
+    return ''.join([
+        f'  - name:       {name}\n'
+        f'    parts:\n'
+        + ''.join([f'      - name: {part}\n' for part in parts])
+        for name, parts in imports
+    ])
+
+def _ensemble(path, exports, parts, imports=()):
+    text = f'exports:        {_yamlList(exports)}\n\nparts:\n'
+    for part in parts:
+        text += f'\n  - name:       {part["name"]}\n'
+        for key, value in part.items():
+            if key == 'name': continue
+            elif isinstance(value, (list, tuple)):
+                text += f'    {key + ":":<11} {_yamlList(value)}\n'
+            else:
+                text += f'    {key + ":":<11} "{value}"\n'
+    if imports:
+        text += f'\nimports:\n{_imports(imports)}'
+    _write(path, text)
+
+def generate(path, parameters=DEFAULT):
+    """Create a synthetic stock under path, replacing any existing one"""
+    p = parameters
+    path = pathlib.Path(path)
+    shutil.rmtree(path, ignore_errors=True)
+    grades = [gradeName(g) for g in range(max(1, p.grades))]
+    def directory(index):
+        return path / grades[index % len(grades)] / ensembleName(index)
+    ensembles = max(p.ensembles, p.depth + p.fanout)
+    for index in range(ensembles):
+        here = directory(index)
+        names = [partName(index, part) for part in range(max(1, p.parts))]
+        isChain = index + 1 < p.depth
+        imports = [(ensembleName(index + 1), [partName(index + 1, 0)])] if isChain else []
+        parts = []
+        for part, name in enumerate(names):
+            uses = names[1:] if part == 0 else []
+            if part == 0 and isChain: uses = uses + [partName(index + 1, 0)]
+            dictionary = {'name': name, 'path': f'{name}.py'}
+            source = _source(name, uses, p.lines)
+            _write(here / f'{name}.py', source)
+            if part == 0 and p.tagEvery and index % p.tagEvery == 0:
+                dictionary['path+bench'] = f'{name}_bench.py'
+                dictionary['path+bench+fast'] = f'{name}_fast.py'
+                _write(here / f'{name}_bench.py', source)
+                _write(here / f'{name}_fast.py', source)
+            if uses: dictionary['uses'] = uses
+            parts.append(dictionary)
+        _ensemble(here / f'{ensembleName(index)}.mupy', names[:1], parts, imports)
+    top = path / grades[0]
+    diamond = []
+    for level in range(p.diamond):
+        d, l, r, n = (f'd{level}', f'd{level}l', f'd{level}r', f'd{level + 1}')
+        diamond.append({'name': d, 'path': f'{d}.py', 'uses': [l, r]})
+        diamond.append({'name': l, 'path': f'{l}.py', 'uses': [n]})
+        diamond.append({'name': r, 'path': f'{r}.py', 'uses': [n]})
+    diamond.append({'name': f'd{p.diamond}', 'path': f'd{p.diamond}.py'})
+    for part in diamond:
+        _write(top / 'diamond' / part['path'],
+               _source(part['name'], part.get('uses', ()), p.lines))
+    _ensemble(top / 'diamond' / 'diamond.mupy', ['d0'], diamond)
+    shelled = []
+    for index in range(p.shells):
+        name = f's{index}'
+        shelled.append({
+            'name': name, 'path': f'{name}.py', 'shell': ['echo {origin} {that}'],
+        })
+        _write(top / 'shelled' / f'{name}.py', _source(name, (), p.lines))
+    _ensemble(top / 'shelled' / 'shelled.mupy', [s['name'] for s in shelled], shelled)
+    asset = b'\0' * p.assetSize
+    for index in range(p.assets):
+        assetPath = top / 'assets' / 'assets' / f'{index // 100:03d}' / f'{index:05d}.bin'
+        assetPath.parent.mkdir(parents=True, exist_ok=True)
+        assetPath.write_bytes(asset)
+    (top / 'assets' / 'assets').mkdir(parents=True, exist_ok=True)
+    _ensemble(top / 'assets' / 'assets.mupy', ['assets'], [
+        {'name': 'assets', 'path': 'assets'},
+    ])
+    fanout = [(ensembleName(index), [partName(index, 0)])
+              for index in range(p.depth, p.depth + p.fanout)]
+    imports = (
+        ([(ensembleName(0), [partName(0, 0)])] if p.depth else [])
+        + [('diamond', ['d0'])]
+        + ([('shelled', [s['name'] for s in shelled])] if shelled else [])
+        + [('assets', ['assets'])]
+        + fanout
+    )
+    uses = [part for _, parts in imports for part in parts]
+    _write(top / APP / 'main.py', _source(ENTRY, [u for u in uses if u != 'assets'], 0))
+    _ensemble(top / APP / f'{APP}.mupy', [ENTRY], [
+        {'name': ENTRY, 'path': 'main.py', 'uses': uses},
+    ], imports)
+    return path
@@ -19,10 +19,14 @@
 ####            https://mit-license.org/
 ####
 
+import argparse
+import concurrent.futures
 import os
 import pathlib
 import pkgutil
+import subprocess
 import sys
+import time
 
 from .configuration import (
     Configuration,
@@ -31,12 +35,21 @@ from .configuration import (
     ConfigurationSyntaxError,
     )
 from . import design
+from . import graph
 from . import host
+from . import lock
+from . import progress
 from .quiet import Quiet; qprint = Quiet.qprint
+from . import report
+from . import scheduler
+from .scheduler import Scheduler
 from . import shell
+from . import stats
+from .stats import Stats
 from . import syntax
 from . import tag
 from . import target
+from .trace import Trace
 from . import version
 
 _MUPY = version.NAME
@@ -86,7 +99,14 @@ Commands: {_MUPY_HOST}, {_MUPY_TARGET}, {_MUPY}
             '--force': { 'help': 'Overwrite any existing file', 'action': 'store_true' },
         }),
         'setup': ({'help': f"Set up the configuration in '{_MUPY_HOST_YAML}'"}, {
-            '--force': { 'help': 'Overwrite any existing files', 'action': 'store_true' },
+            '--force': {
+                'help': 'Overwrite any existing files and rebuild Docker images',
+                'action': 'store_true',
+            },
+        }),
+        'image': ({'help': 'Save or load the Docker images as tarballs'}, {
+            'action': { 'choices': ('export', 'import'), },
+            'path': { 'help': 'Directory of <mode>.tar files' },
         }),
         # 'demo': ({'help': f"Install the demo files"}, {
         #     '--force': { 'help': 'Overwrite any existing files', 'action': 'store_true' },
@@ -105,15 +125,26 @@ class Host(Command):
         qprint(f"Setting up from '{self._configuration.path}'")
         host.Host.fromConfiguration(self._configuration).setup(self._args.force)
         if _IS_DOCKER:
-            for name in ('cpython', 'micropython'):
-                try:
-                    target.Mode.fromConfiguration(
-                        self._configuration, name
-                    ).install(qprint)
-                except KeyError:
-                    raise ConfigurationMissingError(
-                        f"Missing mode configuration for '{name}'"
-                    )
+            for mode in self._modes():
+                mode.install(qprint, self._args.force)
+
+    def _modes(self):
+        for name in ('cpython', 'micropython'):
+            try:
+                yield target.Mode.fromConfiguration(self._configuration, name)
+            except KeyError:
+                raise ConfigurationMissingError(
+                    f"Missing mode configuration for '{name}'"
+                )
+
+    def image(self):
+        if not _IS_DOCKER: raise CommandError(_RUN_PIP_INSTALL_DOCKER)
+        path = pathlib.Path(self._args.path)
+        if self._args.action == 'export':
+            path.mkdir(parents=True, exist_ok=True)
+            for mode in self._modes(): mode.export(path, qprint)
+        else:
+            for mode in self._modes(): mode.load(path, qprint)
 
     def remove(self):
         target.DockerMode.removeAllImages(qprint)
@@ -130,6 +161,15 @@ class Target(Command):
 
 _APP = 'ensemble^entry[@target]'
 
+def _outputMode(value):
+    # argparse skips the choices check for a default from MUPY_OUTPUT
+    if value not in progress.MODES:
+        raise argparse.ArgumentTypeError(
+            f"invalid choice: {value!r} (choose from"
+            f" {', '.join([repr(m) for m in progress.MODES])})"
+        )
+    return value
+
 def _mupyOptions(options={}):
     args = {
         '--grade': {
@@ -144,11 +184,68 @@ def _mupyOptions(options={}):
             'help': 'Select an ensemble and entry part with an optional target',
             'type': str, 'nargs': '?', 'default': '+',
         },
+        '--trace': {
+            'help': 'Write Chrome trace events for the build phases to FILE',
+            'metavar': 'FILE',
+        },
+        '--output': {
+            'help': 'Show a status line or one line per file;'
+            + " auto shows the status line on a terminal\ndefault='%(default)s'",
+            'type': _outputMode, 'choices': progress.MODES,
+            'default': os.environ.get('MUPY_OUTPUT', progress.AUTO),
+        },
+        '--log': {
+            'help': 'Append the full per-file log to FILE',
+            'metavar': 'FILE',
+        },
+        '--jobs': {
+            'help': 'Run at most this many CPU-bound jobs at once;'
+            + ' default is the number of CPUs',
+            'type': int, 'default': os.environ.get('MUPY_JOBS'),
+        },
     }
     args.update(options)
     return args
 
+_kitOptions = {
+    '--force': {
+        'action': 'store_true', 'default': False,
+        'help': 'Rerun every stage even when its inputs are unchanged',
+    },
+    '--shake': {
+        'action': 'store_true', 'default': False,
+        'help': 'Exclude Python modules not imported from the entry',
+    },
+    '--locked': {
+        'action': 'store_true', 'default': False,
+        'help': "Use the BOM saved by 'mupy lock' instead of resolving the stock",
+    },
+}
+
+_buildOptions = {
+    **_kitOptions,
+    '--size': {
+        'action': 'store_true', 'default': False,
+        'help': 'Report installed bytes by ensemble^part and ensemble',
+    },
+}
+
+_testOptions = {
+    k: v for k, v in _mupyOptions({
+        **_buildOptions,
+        '--targets': {
+            'help': 'Comma-separated targets; default is the default target',
+            'type': str,
+        },
+        '--report': {
+            'help': 'Write JUnit XML if FILE ends with .xml, else JSON',
+            'metavar': 'FILE',
+        },
+    }).items() if k not in (_APP, '--locked')
+}
+
 class CommandError(ValueError): pass
+class TestError(ValueError): pass
 
 @command(
     version.NAME,
@@ -156,25 +253,101 @@ class CommandError(ValueError): pass
     subcommands = {
         'stock': ({ 'help': 'Show the available stock' }, _mupyOptions()),
         'bom': ({ 'help': 'Show the import tree for a part' }, _mupyOptions()),
-        'kit': ({ 'help': 'Prepare an application to build' }, _mupyOptions()),
-        'build': ({ 'help': 'Prepare to install app@target' }, _mupyOptions()),
-        'install': ({ 'help': 'Prepare to run app@target' }, _mupyOptions()),
+        'lock': ({ 'help': 'Save the resolved import tree for kit --locked' },
+                 _mupyOptions()),
+        'kit': ({ 'help': 'Prepare an application to build' }, _mupyOptions(_kitOptions)),
+        'build': ({ 'help': 'Prepare to install app@target' }, _mupyOptions(_buildOptions)),
+        'install': ({ 'help': 'Prepare to run app@target' }, _mupyOptions(_buildOptions)),
         'run': ({ 'help': 'Run app@target' },
                 _mupyOptions({
+                    **_buildOptions,
                     '--silent': {
                         'action': 'store_true', 'default': False,
                         'help': 'Suppress execution output; Implies --quiet',
-                    }
+                    },
+                    '--profile-imports': {
+                        'action': 'store_true', 'default': False,
+                        'help': 'Report time and heap for each module import'
+                        + "; main runs as module '_mupy_main'",
+                    },
                 })
         ),
+        'test': ({ 'help': "Run exported 'test: true' entries on targets" },
+                 _testOptions),
+        'stats': ({ 'help': 'Show build statistics and flag regressions' }, {
+            _APP: {
+                'help': 'Only show this ensemble^entry[@target]',
+                'type': str, 'nargs': '?', 'default': None,
+            },
+            '--last': {
+                'help': "Runs to show for each command and app\ndefault='%(default)s'",
+                'type': int, 'default': 10,
+            },
+            '--threshold': {
+                'help': 'Flag runs doing this many times the work of the'
+                + " previous one\ndefault='%(default)s'",
+                'type': float, 'default': 2.0,
+            },
+        }),
     },
 )
 class MuPy(Command):
 
-    def __init__(self, configuration, args):
+    def __init__(
+            self, configuration, args, stock=None, output=qprint, isolate=False,
+            fileOutput=None, stage=lambda name: None, isQuiet=None,
+    ):
         super().__init__(configuration, args)
         self._configuration = configuration
         self._args = args
+        self._stockCache = stock
+        self._print = output
+        self._file = fileOutput or output
+        self._stage = stage
+        # Kits per target let one entry build for several targets at once
+        self._isolate = isolate
+        # None follows the global Quiet setting
+        self._isQuiet = isQuiet
+
+    _RECORD = ('kit', 'build', 'install', 'run', 'test', )
+    _STATS = '.stats.jsonl'
+
+    def _do(self, subcommand):
+        trace = getattr(self._args, 'trace', None)
+        if trace: Trace.start()
+        Stats.reset()
+        if hasattr(self._args, 'jobs'): Scheduler.configure(self._args.jobs)
+        renderer = None
+        if hasattr(self._args, 'output'):
+            renderer = progress.fromMode(self._args.output, self._args.log)
+            self._print = renderer.message
+            self._file = renderer.file
+            self._stage = renderer.stage
+        start = time.perf_counter()
+        isOkay = False
+        try:
+            with Trace.span(f'{_MUPY} {subcommand}', 'command'):
+                result = super()._do(subcommand)
+            isOkay = True
+            return result
+        finally:
+            if renderer: renderer.close()
+            if trace: Trace.write(trace)
+            if subcommand in MuPy._RECORD:
+                self._record(subcommand, isOkay, time.perf_counter() - start)
+
+    def _record(self, subcommand, isOkay, seconds):
+        app = (
+            f'{self._args.targets or ""}' if subcommand == 'test'
+            else vars(self._args)[_APP]
+        )
+        try:
+            Stats.append(
+                self._host.buildPath / MuPy._STATS,
+                Stats.record(subcommand, app, isOkay, seconds),
+            )
+        except OSError:
+            pass
 
     @property
     def _host(self): return host.Host.fromConfiguration(self._configuration)
@@ -196,18 +369,31 @@ class MuPy(Command):
         return target.Target.fromConfiguration(self._configuration, self._app.target)
 
     def _stock(self):
-        return design.Stock.fromPath(self._host.stockPath, self._grade)
+        if self._stockCache is None:
+            with Trace.span('Stock.fromPath', 'stage'), Stats.time('stock'):
+                self._stockCache = design.Stock.fromPath(
+                    self._host.stockPath, self._grade
+                )
+        return self._stockCache
 
     def stock(self):
-        stock = self._stock()
-        for ensembleSet in stock.ensembleSets:
-            for ensemble in ensembleSet:
-                qprint(ensemble.asYAML(delimiter='--\n'))
+        with Trace.span('MuPy.stock', 'stage'):
+            stock = self._stock()
+            for ensembleSet in stock.ensembleSets:
+                for ensemble in ensembleSet:
+                    qprint(ensemble.asYAML(delimiter='--\n'))
                     
     def _bom(self, ensembleName, entryName):
+        if getattr(self._args, 'locked', False):
+            with Trace.span('Lock.bom', 'stage'), Stats.time('bom'):
+                return self._lock.bom(
+                    self._host.stockPath, self._app.entryName, self._grade,
+                    self._args.tags, self._target,
+                )
         stock = self._stock()
         component = stock.getComponent(entryName, self._app.ensemble, self._app.entry)
-        return design.BOM.fromStock(stock, component)
+        with Trace.span('BOM.fromStock', 'stage'), Stats.time('bom'):
+            return design.BOM.fromStock(stock, component)
                     
     def bom(self):
         def printComponent(component, indent):
@@ -215,45 +401,333 @@ class MuPy(Command):
                 f'{" "*indent}'
                 + f'{component.ensemble.grade}[{component.name}]'
             )
-        self._bom(self._app.ensemble, self._app.entry).walk(
-            printComponent, lambda arg: arg + 2, 0
-        )
+        with Trace.span('MuPy.bom', 'stage'):
+            self._bom(self._app.ensemble, self._app.entry).walk(
+                printComponent, lambda arg: arg + 2, 0
+            )
                     
+    @property
+    def _lock(self):
+        if not hasattr(self, '_lockCache'):
+            self._lockCache = lock.Lock.fromPath(self._host.lockPath(self._app))
+        return self._lockCache
+
+    def lock(self):
+        # Lock every configured target, so the lock serves any of them
+        app = design.App(*syntax.App.parse(vars(self._args)[_APP]))
+        stock = self._stock()
+        component = stock.getComponent(app.entry, app.ensemble, app.entry)
+        with Trace.span('BOM.fromStock', 'stage'), Stats.time('bom'):
+            bom = design.BOM.fromStock(stock, component)
+        lockPath = self._host.lockPath(app)
+        with Trace.span('Lock.fromBOM', 'stage'):
+            lock.Lock.fromBOM(
+                bom, app.entryName, self._host.stockPath, self._grade,
+                self._args.tags,
+                [
+                    target.Target.fromConfiguration(self._configuration, t.get('name'))
+                    for t in self._configuration.targets
+                ],
+            ).write(lockPath)
+        self._print(f'Locked {app.entryName} in {lockPath}')
+
+    def _stockInputs(self):
+        # A lock names the only ensemble directories a kit can read
+        if getattr(self._args, 'locked', False):
+            paths = self._lock.ensemblePaths(self._host.stockPath)
+            return [
+                lock.sha256(self._host.lockPath(self._app)),
+                *[graph.Fingerprint.ofTree(p) for p in paths],
+            ]
+        return [graph.Fingerprint.ofTree(self._host.stockPath)]
+
+    @property
+    def _graph(self):
+        if not hasattr(self, '_graphCache'):
+            self._graphCache = graph.Graph(
+                self._host.buildPath / '.fingerprint'
+                / self._app.entryName / f'{self._target.name}.json',
+                self._args.force, self._print,
+            )
+        return self._graphCache
+
+    @property
+    def _targetConfiguration(self):
+        name = self._target.name
+        return [t for t in self._configuration.targets if t.get('name') == name]
+
+    @property
+    def _compilerInputs(self):
+        # A new Python, mpy-cross or image must rebuild what it compiled
+        return [
+            self._target.compiler, self._target.compileOptions,
+            self._configuration.mode,
+        ]
+
+    @staticmethod
+    def _restoreTree(fromDictionary):
+        # The output tree may since have been rebuilt for another target
+        def restore(record):
+            if graph.Fingerprint.ofTree(record['path']) != record['tree']:
+                return None
+            return fromDictionary(record)
+        return restore
+
+    @staticmethod
+    def _saveTree(result):
+        record = result.asDictionary()
+        record['tree'] = graph.Fingerprint.ofTree(record['path'])
+        return record
+
+    @property
+    def _kitTask(self):
+        return graph.Task(
+            'kit',
+            lambda: [
+                version.VERSION,
+                *self._stockInputs(),
+                self._app.entryName, self._grade, self._args.tags,
+                self._targetConfiguration, *self._compilerInputs,
+                self._configuration.shell, str(self._args.directory),
+                self._args.shake, getattr(self._args, 'profile_imports', False),
+            ],
+            self._kit,
+            MuPy._saveTree,
+            MuPy._restoreTree(design.Kit.fromDictionary),
+        )
+
+    @property
+    def _buildTask(self):
+        return graph.Task(
+            'build',
+            lambda: [
+                version.VERSION,
+                self._targetConfiguration, *self._compilerInputs,
+            ],
+            self._build,
+            MuPy._saveTree,
+            MuPy._restoreTree(
+                lambda record: design.Build.fromDictionary(record, self._target)
+            ),
+            (self._kitTask, ),
+        )
+
+    @property
+    def _installTask(self):
+        return graph.Task(
+            'install',
+            lambda: [version.VERSION, self._targetConfiguration],
+            self._install,
+            lambda install: {},
+            lambda record: design.Install(self._graph.run(self._buildTask)),
+            (self._buildTask, ),
+        )
+
     def kit(self):
+        with Trace.span('MuPy.kit', 'stage'):
+            return self._graph.run(self._kitTask)
+
+    def _kit(self):
         def callback(fromPath, toPath):
-            qprint('  ' +
-                   (str(fromPath.relative_to(self._host.stockPath))
-                    if isinstance(fromPath, pathlib.Path) else str(fromPath))
+            # Shell output arrives as strings and always prints in full
+            if not isinstance(toPath, pathlib.Path):
+                self._print('  ' + str(fromPath))
+                self._print(str(toPath))
+                return
+            self._file(
+                '  ' + str(fromPath.relative_to(self._host.stockPath)),
+                str(toPath.relative_to(self._host.buildPath)),
             )
-            qprint(
-                str(toPath.relative_to(self._host.buildPath))
-                if isinstance(toPath, pathlib.Path) else str(toPath)
+        bom = self._bom(self._app.ensemble, self._app.entry)
+        self._stage('kit')
+        with Stats.time('kit'):
+            kit = design.Kit.fromBOM(
+                bom,
+                self._host.kitPath(
+                    self._app, self._target.name if self._isolate else None
+                ),
+                self._target.tagRay.plus(tag.TagRay.fromString(self._args.tags)),
+                shell.Shell.fromDictionary(self._configuration.shell, self._args.directory),
+                callback,
             )
-        return design.Kit.fromBOM(
-            self._bom(self._app.ensemble, self._app.entry),
-            self._host.kitPath(self._app),
-            self._target.tagRay.plus(tag.TagRay.fromString(self._args.tags)),
-            shell.Shell.fromDictionary(self._configuration.shell, self._args.directory),
-            callback,
-        )
+            if self._args.shake:
+                with Trace.span('Kit.shake', 'stage'):
+                    kit = kit.shake(self._print)
+            if getattr(self._args, 'profile_imports', False):
+                kit = kit.profileImports(self._print)
+            return kit
 
     def build(self):
-        return design.Build.fromKit(
-            self.kit(),
-            self._host.buildPath,
-            self._app.entryName,
-            self._target,
-            qprint,
-        )
-        
+        with Trace.span('MuPy.build', 'stage'):
+            build = self._graph.run(self._buildTask)
+            design.Size.fromBuild(
+                build, self._host.buildPath, self._app.entryName,
+                self._print, self._args.size,
+            )
+            return build
+
+    def _build(self):
+        kit = self.kit()
+        self._stage('build')
+        with Stats.time('build'):
+            return design.Build.fromKit(
+                kit,
+                self._host.buildPath,
+                self._app.entryName,
+                self._target,
+                self._print,
+                self._file,
+            )
+
     def install(self):
-        return design.Install.fromBuild(self.build(), qprint, Quiet.get())
+        build = self.build()
+        with Trace.span('MuPy.install', 'stage'):
+            return self._graph.run(self._installTask)
+
+    def _install(self):
+        build = self._graph.run(self._buildTask)
+        self._stage('install')
+        with Stats.time('install'):
+            return design.Install.fromBuild(
+                build, self._print,
+                Quiet.get() if self._isQuiet is None else self._isQuiet,
+            )
 
     def run(self):
         if self._args.silent: Quiet.set(True)
-        return design.Runner.fromInstall(
-            self.install(), qprint, isSilent=self._args.silent
+        install = self.install()
+        with Trace.span('MuPy.run', 'stage'), Stats.time('run'):
+            return design.Runner.fromInstall(
+                install, self._print, isSilent=self._args.silent
+            )
+
+    def stats(self):
+        app = vars(self._args)[_APP]
+        groups = {}
+        for record in Stats.load(self._host.buildPath / MuPy._STATS):
+            if app and record.get('app') != app: continue
+            groups.setdefault((record['command'], record['app']), []).append(record)
+        flagged = 0
+        for (command, recordApp), records in groups.items():
+            rows = []
+            # Comparable runs also skipped the same stages
+            previous = {}
+            for record in records:
+                key = tuple(sorted([
+                    k for k in record['counters'] if k.startswith(stats.SKIPPED)
+                ]))
+                flags = (
+                    Stats.regressions(record, previous[key], self._args.threshold)
+                    if key in previous and record['ok'] else []
+                )
+                if record['ok']: previous[key] = record
+                rows.append((record, flags))
+            qprint(f'{command} {recordApp}')
+            qprint(
+                f'  {"time":<19} {"":<4} {"seconds":>8} {"compiled":>8}'
+                f' {"cached":>6} {"kitted":>12} {"installed":>12}  skipped'
+            )
+            for record, flags in rows[-self._args.last:]:
+                counters = record['counters']
+                def files(count, size):
+                    return f'{counters.get(count, 0)}/{stats.size(counters.get(size, 0))}'
+                skipped = ','.join(sorted([
+                    k[len(stats.SKIPPED):] for k in counters
+                    if k.startswith(stats.SKIPPED)
+                ]))
+                qprint(
+                    f'  {record["time"]:<19} {"ok" if record["ok"] else "FAIL":<4}'
+                    f' {record["seconds"]:>8.3f}'
+                    f' {counters.get(stats.COMPILED, 0):>8}'
+                    f' {counters.get(stats.CACHED, 0):>6}'
+                    f' {files(stats.KIT_FILES, stats.KIT_BYTES):>12}'
+                    f' {files(stats.INSTALL_FILES, stats.INSTALL_BYTES):>12}'
+                    f'  {skipped or "-"}'
+                )
+                for name, then, now in flags:
+                    qprint(f'  ! {name} {then} -> {now}')
+                flagged += len(flags)
+        if flagged:
+            qprint(f'{flagged} regressions flagged')
+
+    def _testTargets(self):
+        names = (
+            [n.strip() for n in self._args.targets.split(',') if n.strip()]
+            if self._args.targets
+            else [target.Target.fromConfiguration(self._configuration).name]
+        )
+        for name in names:
+            if not name == _GHOST and not _IS_DOCKER:
+                raise CommandError(_RUN_PIP_INSTALL_DOCKER)
+        return [target.Target.fromConfiguration(self._configuration, n) for n in names]
+
+    def _test(self, stock, entryName, targetName):
+        log = []
+        output = []
+        args = argparse.Namespace(**vars(self._args))
+        vars(args)[_APP] = f'{entryName}@{targetName}'
+        args.silent = False
+        mupy = MuPy(
+            self._configuration, args, stock,
+            lambda *items, **kwargs: log.append(' '.join(map(str, items)) + '\n'),
+            isolate=True,
+        )
+        status, message = report.PASSED, None
+        start = time.perf_counter()
+        try:
+            with Trace.span('MuPy.test', 'stage', entry=entryName, target=targetName):
+                design.Runner.fromInstall(mupy.install(), mupy._print, output=output.append)
+        except subprocess.CalledProcessError as exception:
+            status, message = report.FAILED, str(exception)
+        except Exception as exception:
+            status, message = report.ERROR, f'{exception.__class__.__name__}: {exception}'
+        return report.Result(
+            entryName, targetName, status, time.perf_counter() - start,
+            ''.join(output), ''.join(log), message,
+        )
+
+    def test(self):
+        start = time.perf_counter()
+        targets = self._testTargets()
+        stock = self._stock()
+        entryNames = [design.EntryName(*entry) for entry in stock.testEntries()]
+        self._print(f'Testing {len(entryNames)} entries on {", ".join([t.name for t in targets])}')
+        # A device pool per target; one device cannot run two tests at once
+        results = []
+        futures = []
+        try:
+            futures = [
+                Scheduler.executor(scheduler.DEVICE, t.name, t.isParallel).submit(
+                    self._test, stock, entryName, t.name,
+                )
+                for t in targets for entryName in entryNames
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results.append(result)
+                self._print(
+                    f'{result.status.upper():<6} {result.entry}@{result.target}'
+                    f' {result.seconds:.2f}s'
+                )
+                if result.status != report.PASSED:
+                    self._print(f'  {result.message}')
+                    for text in (result.log, result.output):
+                        for line in text.splitlines(): self._print(f'  | {line}')
+        finally:
+            Scheduler.finish(futures)
+        results.sort(key=lambda r: (r.target, r.entry))
+        seconds = time.perf_counter() - start
+        counts = report.counts(results)
+        self._print(
+            ', '.join([f'{n} {status}' for status, n in counts.items()])
+            + f' in {seconds:.2f}s'
         )
+        if self._args.report:
+            report.write(self._args.report, results, seconds)
+        failures = len(results) - counts[report.PASSED]
+        if failures:
+            raise TestError(f'{failures} of {len(results)} tests did not pass')
+        return results
 
 
 def _main(cls):
@@ -0,0 +1,214 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/api.py
+####
+#### synopsis:  Build and run applications in-process
+####
+#### description:
+####
+####    A Session loads the host configuration once and reuses the parsed
+####    stock until a file in it changes. Each call takes its own output
+####    sinks and returns a result tuple instead of printing. Calls may
+####    come from several threads; calls for the same entry and target
+####    take turns, since they share build directories. Sessions share
+####    the process-wide job budget: the first to set jobs fixes it.
+####
+####        from mupy.api import Session
+####        session = Session('~/project')
+####        result = session.run('hello^demo', 'ghost')
+####        print(result.returncode, result.output)
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import argparse
+from collections import namedtuple
+import pathlib
+import subprocess
+import threading
+import time
+
+from . import _APP, _MUPY_HOST_YAML, MuPy
+from .configuration import Configuration
+from . import design
+from . import graph
+from . import host
+from .scheduler import Scheduler, SchedulerError
+from . import syntax
+
+BuildResult = namedtuple(
+    'BuildResult',
+    ('app', 'target', 'path', 'components', 'seconds', 'stages', 'log'),
+)
+
+RunResult = namedtuple(
+    'RunResult',
+    ('app', 'target', 'path', 'returncode', 'output', 'seconds', 'stages', 'log'),
+)
+
+class SessionError(ValueError): pass
+
+# Command line options a Session has no way to honour
+_UNSUPPORTED = ('trace', 'jobs', 'output', )
+
+class _Call:
+
+    # Collects one call's log lines and stage times
+    def __init__(self, log=None):
+        self._sink = log
+        self._lines = []
+        self._stages = {}
+        self._stageName = None
+        self._stageStart = None
+        self._start = time.perf_counter()
+
+    def message(self, *items, **kwargs):
+        self.line(' '.join([str(item) for item in items]))
+
+    def file(self, *lines):
+        for line in lines: self.line(str(line))
+
+    def line(self, line):
+        self._lines.append(line + '\n')
+        if self._sink: self._sink(line)
+
+    def stage(self, name):
+        self.finish()
+        self._stageName = name
+        self._stageStart = time.perf_counter()
+
+    def finish(self):
+        if self._stageName:
+            self._stages[self._stageName] = time.perf_counter() - self._stageStart
+            self._stageName = None
+
+    @property
+    def seconds(self): return time.perf_counter() - self._start
+
+    @property
+    def stages(self): return dict(self._stages)
+
+    @property
+    def log(self): return ''.join(self._lines)
+
+class Session:
+
+    def __init__(self, directory='.', configuration=_MUPY_HOST_YAML, jobs=None):
+        self._directory = pathlib.Path(directory).expanduser().resolve()
+        self._configuration = Configuration.fromSearch(self._directory, configuration)
+        self._host = host.Host.fromConfiguration(self._configuration)
+        if jobs is not None:
+            try:
+                Scheduler.configure(jobs, isReplace=False)
+            except SchedulerError as exception:
+                raise SessionError(str(exception))
+        self._lock = threading.Lock()
+        self._stocks = {}
+        self._appLocks = {}
+
+    @property
+    def configuration(self): return self._configuration
+
+    @property
+    def directory(self): return self._directory
+
+    def reload(self):
+        with self._lock:
+            self._stocks = {}
+
+    def stock(self, grade=None):
+        # Parsed once per grade and reparsed only when the stock changes
+        fingerprint = graph.Fingerprint.ofTree(self._host.stockPath)
+        with self._lock:
+            cached = self._stocks.get(grade)
+            if cached and cached[0] == fingerprint: return cached[1]
+        stock = design.Stock.fromPath(
+            self._host.stockPath,
+            None if grade is None else syntax.Identifier.check(grade),
+        )
+        with self._lock:
+            self._stocks[grade] = (fingerprint, stock)
+        return stock
+
+    def _appLock(self, name):
+        with self._lock:
+            return self._appLocks.setdefault(name, threading.Lock())
+
+    def _args(self, subcommand, app, options):
+        args = argparse.Namespace(
+            directory=str(self._directory),
+            configuration=self._configuration.path.name,
+            quiet=True, debug=False, subcommand=subcommand,
+        )
+        for option, arguments in MuPy.SUBCOMMANDS[subcommand][1].items():
+            vars(args)[option.lstrip('-').replace('-', '_')] = arguments.get('default')
+        vars(args)[_APP] = app
+        for name, value in options.items():
+            if name not in vars(args) or name == _APP:
+                raise SessionError(f"Unknown {subcommand} option '{name}'")
+            if name in _UNSUPPORTED:
+                raise SessionError(f"Option '{name}' is not supported by a Session")
+            if value is not None: vars(args)[name] = value
+        return args
+
+    def _mupy(self, subcommand, app, target, call, options):
+        appName = f'{app}@{target}' if target else app
+        args = self._args(subcommand, appName, options)
+        mupy = MuPy(
+            self._configuration, args, self.stock(args.grade), call.message,
+            isolate=True, fileOutput=call.file, stage=call.stage, isQuiet=True,
+        )
+        return appName, mupy
+
+    def build(self, app, target=None, log=None, **options):
+        # options: tags, grade, force, shake, locked, size
+        call = _Call(log)
+        appName, mupy = self._mupy('build', app, target, call, options)
+        with self._appLock(appName):
+            build = mupy.build()
+        call.finish()
+        return BuildResult(
+            app, build.target.name, build.path,
+            {str(k): v for k, v in build.components.items()},
+            call.seconds, call.stages, call.log,
+        )
+
+    def install(self, app, target=None, log=None, **options):
+        call = _Call(log)
+        appName, mupy = self._mupy('install', app, target, call, options)
+        with self._appLock(appName):
+            build = mupy.install().build
+        call.finish()
+        return BuildResult(
+            app, build.target.name, build.path,
+            {str(k): v for k, v in build.components.items()},
+            call.seconds, call.stages, call.log,
+        )
+
+    def run(self, app, target=None, log=None, output=None, **options):
+        # A failing program is a result with a nonzero returncode
+        call = _Call(log)
+        appName, mupy = self._mupy('run', app, target, call, options)
+        chunks = []
+        def collect(text):
+            chunks.append(text)
+            if output: output(text)
+        returncode = 0
+        with self._appLock(appName):
+            install = mupy.install()
+            call.stage('run')
+            try:
+                design.Runner.fromInstall(install, call.message, output=collect)
+            except subprocess.CalledProcessError as exception:
+                returncode = exception.returncode
+        call.finish()
+        return RunResult(
+            app, install.build.target.name, install.build.path, returncode,
+            ''.join(chunks), call.seconds, call.stages, call.log,
+        )
@@ -0,0 +1,201 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/bootstrap.py
+####
+#### synopsis:  Generate bootstrap 'main' modules for the install tree
+####
+#### description:
+####
+####    The generated sources run on MicroPython and CPython alike, and
+####    are compiled by the build like any other kit module.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+PROFILE_MAIN = '_mupy_main'
+PROFILE_MARKER = 'mupy-profile-imports'
+
+def profileImports(components, imports=(), main=PROFILE_MAIN, marker=PROFILE_MARKER):
+    # Ports with a read-only builtins.__import__ run each of main's
+    # module-level imports on its own first, so each still gets a row
+    statements = ''.join([
+        f"def _import{i}():\n    {statement}\n"
+        for i, (name, statement) in enumerate(imports)
+    ])
+    return f"""\
+# Generated by 'mupy run --profile-imports'
+import builtins
+import gc
+import sys
+try:
+    from time import ticks_us as _ticks, ticks_diff as _diff
+except ImportError:
+    from time import perf_counter as _counter
+    _ticks = lambda: int(_counter() * 1000000)
+    _diff = lambda end, start: end - start
+try:
+    _alloc = gc.mem_alloc
+    _free = gc.mem_free
+except AttributeError:
+    import tracemalloc
+    tracemalloc.start()
+    _alloc = lambda: tracemalloc.get_traced_memory()[0]
+    _free = lambda: -1
+
+_COMPONENTS = {components!r}
+_import = builtins.__import__
+_records = []
+_depth = [0]
+
+def _measure(name, function, *args, **kwargs):
+    record = [name, _depth[0], 0, 0, 0]
+    _records.append(record)
+    _depth[0] += 1
+    gc.collect()
+    alloc = _alloc()
+    start = _ticks()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        record[2] = _diff(_ticks(), start)
+        record[3] = _alloc() - alloc
+        record[4] = _free()
+        _depth[0] -= 1
+
+def _resolve(name, globals=None, locals=None, fromlist=(), level=0):
+    # The absolute name of a relative import, or None if it has no package
+    if not level: return name
+    globals = globals or {{}}
+    package = globals.get('__package__')
+    if not package:
+        package = globals.get('__name__', '')
+        if '__path__' not in globals: package = package.rpartition('.')[0]
+    for _ in range(level - 1): package = package.rpartition('.')[0]
+    if not package: return None
+    return package + '.' + name if name else package
+
+def _profile(name, *args, **kwargs):
+    resolved = _resolve(name, *args, **kwargs)
+    if resolved is None or resolved in sys.modules:
+        return _import(name, *args, **kwargs)
+    return _measure(resolved, _import, name, *args, **kwargs)
+
+{statements}
+_IMPORTS = [{', '.join([f'({name!r}, _import{i})' for i, (name, _) in enumerate(imports)])}]
+
+def _report():
+    print('{marker}')
+    print('%10s %10s %10s  %s' % ('us', 'bytes', 'free', 'module [ensemble^part]'))
+    for name, depth, us, alloc, free in _records:
+        print('%10d %10d %10d  %s%s [%s]' % (
+            us, alloc, free, '  ' * depth, name, _COMPONENTS.get(name, '-'),
+        ))
+
+try:
+    builtins.__import__ = _profile
+    _isHooked = True
+except (AttributeError, TypeError):
+    print('{marker}: builtins.__import__ is read-only; timing each import in main')
+    _isHooked = False
+try:
+    if _isHooked:
+        import {main}
+    else:
+        for _name, _statement in _IMPORTS:
+            if _name in sys.modules: continue
+            try:
+                _measure(_name, _statement)
+            except ImportError:
+                # main meets the same error where it can handle it
+                pass
+        _profile({main!r})
+finally:
+    if _isHooked: builtins.__import__ = _import
+    _report()
+"""
+
+INFLATE_MODULE = '_mupy_inflate'
+INFLATE_DIRECTORY = '_mupyz'
+INFLATE_MANIFEST = 'manifest'
+INFLATE_MARKER = 'mupy-inflate'
+INFLATE_SUFFIX = '.z'
+INFLATE_WBITS = 10
+
+def inflate(root='/flash'):
+    # Run on the device after the staged tree is copied into 'root'
+    return f"""\
+# Generated by mupy for compressed installs
+import os
+try:
+    import deflate
+    _reader = lambda file: deflate.DeflateIO(file, deflate.ZLIB)
+except ImportError:
+    try:
+        import zlib
+        zlib.DecompIO
+        _reader = lambda file: zlib.DecompIO(file, {INFLATE_WBITS})
+    except (ImportError, AttributeError):
+        _reader = None
+
+_ROOT = {root!r}
+_STAGE = _ROOT + '/' + {INFLATE_DIRECTORY!r}
+
+def _makedirs(path):
+    parts = path.split('/')
+    for i in range(2, len(parts)):
+        try:
+            os.mkdir('/'.join(parts[:i]))
+        except OSError:
+            pass
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def main():
+    # 'inflate' lines name staged files; 'keep' lines name files inflated
+    # by an earlier install, which are only checked
+    with open(_STAGE + '/' + {INFLATE_MANIFEST!r}) as file:
+        lines = [line.strip() for line in file if line.strip()]
+    chunk = int(lines[0].split()[1])
+    count = 0
+    stale = 0
+    for line in lines[1:]:
+        action, size, name = line.split(' ', 2)
+        target = _ROOT + '/' + name
+        if action == 'keep':
+            try:
+                isKept = os.stat(target)[6] == int(size)
+            except OSError:
+                isKept = False
+            if not isKept: stale += 1
+            continue
+        staged = _STAGE + '/' + name + {INFLATE_SUFFIX!r}
+        if _reader is not None:
+            _makedirs(target)
+            with open(staged, 'rb') as source:
+                reader = _reader(source)
+                with open(target, 'wb') as output:
+                    while True:
+                        data = reader.read(chunk)
+                        if not data: break
+                        output.write(data)
+            count += 1
+        _remove(staged)
+    _remove(_STAGE + '/' + {INFLATE_MANIFEST!r})
+    _remove(_ROOT + '/' + {INFLATE_MODULE!r} + '.py')
+    if _reader is None:
+        print({INFLATE_MARKER!r}, 'unsupported')
+    elif stale:
+        print({INFLATE_MARKER!r}, 'stale', stale)
+    else:
+        print({INFLATE_MARKER!r}, 'ok', count)
+"""
@@ -1,19 +1,52 @@
 from collections.abc import MutableSet
+import concurrent.futures
+import json
 import os
 import pathlib
+import shlex
 import shutil
+import stat
 import subprocess
+import sys
 import yaml
 import zlib
 
+from . import minify
+from . import scheduler
+from .scheduler import Scheduler
 from . import version
+from . import bootstrap
+from . import shake
 from . import syntax
 from . import tag
+from . import stats
+from .stats import Stats
+from .trace import Trace
 
 _MUPY = version.NAME
 
 def EntryName(ensembleName, partName): return f'{ensembleName}^{partName}'
 
+def CompileOptions(options, location=None):
+    if isinstance(options, str):
+        options = shlex.split(options)
+    if (
+            not isinstance(options, (list, tuple))
+            or
+            not all([isinstance(o, str) for o in options])
+    ):
+        raise EnsembleSemanticError(
+            f"Compile options must be a string or list of strings"
+            + (f" in {location}" if location else '')
+        )
+    return tuple(options)
+
+_tuples = {}
+
+def _intern(strings):
+    strings = tuple([sys.intern(s) for s in strings])
+    return _tuples.setdefault(strings, strings)
+
 class App:
 
     def __init__(self, ensemble, entry=None, target=None):
@@ -39,6 +72,11 @@ class App:
 
 class Part:
 
+    __slots__ = (
+        '_name', '_path', '_pathTagIndex', '_shletTagIndex', '_shellTagIndex',
+        '_uses', '_compileTagIndex', '_isTest',
+    )
+
     @classmethod
     def fromDictionary(cls, dictionary, location):
         name = syntax.Identifier.check(dictionary.get('name'), location)
@@ -102,23 +140,48 @@ class Part:
                      if k.startswith(PATH)
             ]]
         )
-        uses = tuple(
+        uses = _intern(
             [syntax.Identifier.check(e, location)
              for e in dictionary.get('uses', ())]
         )
-        return cls(name, path, pathTagIndex, shletTagIndex, shellTagIndex, uses)
+        COMPILE = 'compile'
+        compileTagIndex = tag.TagIndex(
+            [(tag.TagRay.fromString(tagString), CompileOptions(options, location))
+             for tagString, options in [
+                     (k[len(COMPILE):], v)
+                     for (k, v) in dictionary.items()
+                     if k.startswith(COMPILE)
+            ]]
+        )
+        isTest = dictionary.get('test', False)
+        if not isinstance(isTest, bool):
+            raise EnsembleSemanticError(
+                f"Part 'test' must be true or false for '{name}' in {location}"
+            )
+        return cls(
+            sys.intern(name), path, pathTagIndex, shletTagIndex, shellTagIndex,
+            uses, compileTagIndex, isTest,
+        )
 
-    def __init__(self, name, path, pathTagIndex, shletTagIndex, shellTagIndex, uses):
+    def __init__(
+            self, name, path, pathTagIndex, shletTagIndex, shellTagIndex, uses,
+            compileTagIndex, isTest=False,
+    ):
         self._name = name
         self._path = path
         self._pathTagIndex = pathTagIndex
         self._shletTagIndex = shletTagIndex
         self._shellTagIndex = shellTagIndex
         self._uses = uses
+        self._compileTagIndex = compileTagIndex
+        self._isTest = isTest
 
     @property
     def name(self): return self._name
 
+    @property
+    def isTest(self): return self._isTest
+
     @property
     def path(self): return self._path
 
@@ -131,6 +194,9 @@ class Part:
     def taggedShell(self, tagRay):
         return self._shellTagIndex.max(tagRay)
 
+    def taggedCompile(self, tagRay):
+        return self._compileTagIndex.max(tagRay)
+
     @property
     def uses(self): return self._uses
 
@@ -145,6 +211,8 @@ class Part:
 
 class Import:
 
+    __slots__ = ('_name', '_aliases', '_version', )
+
     @classmethod
     def fromDictionary(cls, dictionary, location):
         name = dictionary.get('name')
@@ -165,9 +233,9 @@ class Import:
                 raise EnsembleSemanticError(
                     f"Duplicate import alias '{alias}' in {l}"
                 )
-            aliases[alias] = aname
+            aliases[sys.intern(alias)] = sys.intern(aname)
         version = dictionary.get('version')
-        return cls(name, aliases, version)
+        return cls(sys.intern(name), aliases, version)
 
     def __init__(self, name, aliases, version):
         self._name = name
@@ -199,6 +267,11 @@ class EnsembleSemanticError(ValueError): pass
 
 class Ensemble:
 
+    __slots__ = (
+        '_grade', '_path', '_name', '_parts', '_exports', '_imports',
+        '_version', '_file',
+    )
+
     @staticmethod
     def nameFromPath(path):
         return path.stem
@@ -224,7 +297,7 @@ class Ensemble:
             if rpath.is_absolute(): raise EnsembleSemanticError(
                     f"Optional path must be relative, not '{rpath}'"
             )
-            exports = tuple(
+            exports = _intern(
                 [syntax.Identifier.check(e, f'{mupyPath} exports')
                  for e in (content.get('exports', ()) or ())]
             )
@@ -237,15 +310,16 @@ class Ensemble:
                  for i in (content.get('imports', ()) or ())]
             )
             return cls(
-                os.path.basename(path),
+                sys.intern(os.path.basename(path)),
                 mupyPath.parent / rpath,
-                cls.nameFromPath(mupyPath), parts,
+                sys.intern(cls.nameFromPath(mupyPath)), parts,
                 exports=exports, imports=imports, version=version,
+                file=mupyPath,
             )
 
     def __init__(
             self, grade, path, name, parts,
-            exports=(), imports=(), version=None,
+            exports=(), imports=(), version=None, file=None,
     ):
         self._grade = grade
         self._path = path
@@ -254,10 +328,14 @@ class Ensemble:
         self._exports = exports
         self._imports = imports
         self._version = version
+        self._file = file
 
     @property
     def grade(self): return self._grade
 
+    @property
+    def file(self): return self._file
+
     @property
     def path(self): return self._path
 
@@ -308,20 +386,23 @@ class EnsembleSet(MutableSet):
         def isMuPy(filename):
             return pathlib.PurePath(filename).suffix == f'.{_MUPY}'
         ensembleSet=cls(grade)
+        names = set()
         for dirpath, dirnames, filenames in os.walk(path, followlinks=True):
             for filename in filenames:
                 if isMuPy(filename):
                     mupyPath = pathlib.Path(dirpath) / filename
                     name = Ensemble.nameFromPath(mupyPath)
-                    if name in [e.name for e in ensembleSet]:
+                    if name in names:
                         gradeLevel = f'grade level {grade} ' if grade else ''
                         raise EnsembleSemanticError(
                             f"Stock {gradeLevel}contains duplicate ensemble '{name}'"
                         )
                     else:
+                        names.add(name)
                         ensembleSet.add(
                             Ensemble.fromPaths(path, mupyPath)
                         )
+                        Stats.add(stats.ENSEMBLES)
         return ensembleSet
 
     def __init__(self, grade):
@@ -339,6 +420,8 @@ class EnsembleSet(MutableSet):
     
 class Component:
 
+    __slots__ = ('_origin', '_ensemble', '_part', )
+
     def __init__(self, origin, ensemble, part):
         self._origin = origin
         self._ensemble = ensemble
@@ -415,10 +498,27 @@ class Stock:
             f"Stock {gradeLevel}does not export '{entryName}'"
         )
 
+    def testEntries(self):
+        # Higher grades shadow lower ones, as in getComponent
+        seen = set()
+        entries = []
+        for ensembleSet in self._ensembleSets:
+            for ensemble in ensembleSet:
+                for name in ensemble.exports:
+                    entryName = EntryName(ensemble.name, name)
+                    if entryName in seen: continue
+                    seen.add(entryName)
+                    part = ensemble.getPart(name)
+                    if part is not None and part.isTest:
+                        entries.append((ensemble.name, name))
+        return sorted(entries)
+
 class BOMError(ValueError): pass
 
 class BOM:
 
+    __slots__ = ('_component', '_children', )
+
     @classmethod
     def fromStock(cls, stock, component, ancestorComponents=[]):
         if component.part in [aC.part for aC in ancestorComponents]:
@@ -445,20 +545,50 @@ class BOM:
             raise BOMError(
                 f"Undefined {EntryName(component.ensemble.name, partName)}"
             )
-        children = [
+        children = tuple([
             cls.fromStock(
                 stock,
                 stock.getComponent(childPartName, *componentArgs(childPartName)),
                 ancestorComponents + [component],
             )
             for childPartName in component.part.uses
-        ]
+        ])
         return cls(component, children)
 
+    @classmethod
+    def fromDictionary(cls, dictionary, ensembles):
+        # ensembles: (grade, name) -> Ensemble, as resolved when the BOM was saved
+        ensemble = ensembles[(dictionary['grade'], dictionary['ensemble'])]
+        part = ensemble.getPart(dictionary['part'])
+        if part is None:
+            raise BOMError(
+                f"Undefined {EntryName(ensemble.name, dictionary['part'])}"
+            )
+        return cls(
+            Component(dictionary['origin'], ensemble, part),
+            tuple([cls.fromDictionary(c, ensembles)
+                   for c in dictionary['children']]),
+        )
+
     def __init__(self, component, children=()):
         self._component = component
         self._children = children
 
+    @property
+    def component(self): return self._component
+
+    @property
+    def children(self): return self._children
+
+    def asDictionary(self):
+        return {
+            'origin': self._component.origin,
+            'grade': self._component.ensemble.grade,
+            'ensemble': self._component.ensemble.name,
+            'part': self._component.part.name,
+            'children': [c.asDictionary() for c in self._children],
+        }
+
     def walk(
             self,
             callback=lambda component, arg: None,
@@ -479,7 +609,17 @@ class Kit:
         shutil.rmtree(path, onerror=lambda type, value, tb: None )
         path.mkdir(parents=True)
         toPaths = {}
+        manifest = {}
+        options = {}
         def doKit(component, isMain):
+            with Trace.span(component.name, 'component', origin=component.origin):
+                _doKit(component, isMain)
+            Stats.add(stats.COMPONENTS)
+        def copy(fromPath, toPath):
+            shutil.copy2(fromPath, toPath)
+            Stats.add(stats.KIT_FILES)
+            Stats.add(stats.KIT_BYTES, os.path.getsize(toPath))
+        def _doKit(component, isMain):
             name = 'main' if isMain else component.origin
             shellDictionary = {
                 'origin': component.origin,
@@ -496,6 +636,11 @@ class Kit:
                         return
                     raise KitError(f"Invalid duplicates '{toPaths[toPath]}' and '{fromPath}' both map to {toPath}")
                 toPaths[toPath] = fromPath
+                manifest[toPath.relative_to(path)] = component.name
+                try:
+                    options[toPath.relative_to(path)] = component.part.taggedCompile(tagRay)
+                except tag.TagIndexError:
+                    pass
                 shellDictionary['this'] = fromPath
                 shellDictionary['that'] = toPath
             try:
@@ -513,12 +658,15 @@ class Kit:
                         s.format(**substitutions)
                         for s in shellStrings
                 ]:
-                    completedProcess = subprocess.run(
-                        shellString,
-                        check=True, shell=True, text=True, input=input,
-                        executable=shell.bin, cwd=shell.cwd, env=shell.env,
-                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                    )
+                    Stats.add(stats.SHELLS)
+                    with Trace.span('shell', 'shell', command=shellString):
+                        completedProcess = Scheduler.submit(
+                            scheduler.CPU, subprocess.run,
+                            shellString,
+                            check=True, shell=True, text=True, input=input,
+                            executable=shell.bin, cwd=shell.cwd, env=shell.env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                        ).result()
                     input = completedProcess.stdout
                     if not isQuiet: callback(shellString, completedProcess.stdout)
             except tag.TagIndexError:
@@ -528,10 +676,10 @@ class Kit:
             if fromPath.exists():
                 toPath.parent.mkdir(parents=True, exist_ok=True)
                 if fromPath.is_file():
-                    shutil.copy2(fromPath, toPath)
+                    copy(fromPath, toPath)
                 elif fromPath.is_dir():
                     shutil.copytree(
-                        fromPath, toPath, symlinks=True, copy_function=shutil.copy2
+                        fromPath, toPath, symlinks=True, copy_function=copy
                     )
                 else:
                     raise KitError(f"Kit part is not valid '{fromPath}'")
@@ -539,26 +687,103 @@ class Kit:
             else:
                 raise KitError(f"Kit part does not exist '{fromPath}'")
         bom.walk(doKit, lambda arg: False, arg=True)
-        return Kit(path)
+        return Kit(path, manifest=manifest, options=options)
 
-    def __init__(self, path):
+    @classmethod
+    def fromDictionary(cls, dictionary):
+        return cls(
+            pathlib.Path(dictionary['path']),
+            [pathlib.Path(rPath) for rPath in dictionary['excludes']],
+            {pathlib.Path(k): v for k, v in dictionary['manifest'].items()},
+            {pathlib.Path(k): tuple(v) for k, v in dictionary['options'].items()},
+        )
+
+    def __init__(self, path, excludes=frozenset(), manifest={}, options={}):
         self._path = path
+        self._excludes = frozenset(excludes)
+        self._manifest = manifest
+        self._options = options
+
+    def asDictionary(self):
+        return {
+            'path': str(self._path),
+            'excludes': sorted([str(rPath) for rPath in self._excludes]),
+            'manifest': {str(k): v for k, v in self._manifest.items()},
+            'options': {str(k): list(v) for k, v in self._options.items()},
+        }
 
     @property
     def path(self): return self._path
+
+    @property
+    def excludes(self): return self._excludes
+
+    @property
+    def manifest(self): return self._manifest
+
+    @property
+    def options(self): return self._options
+
+    def _lookup(self, dictionary, rPath, default):
+        # A file inherits from the nearest kitted file or directory part
+        for path in (rPath, *rPath.parents):
+            if path in dictionary: return dictionary[path]
+        return default
+
+    def componentName(self, rPath): return self._lookup(self._manifest, rPath, None)
+
+    def compileOptions(self, rPath): return self._lookup(self._options, rPath, ())
+
+    def shake(self, callback=lambda line: None):
+        def onError(rPath, exception):
+            callback(f'Shake kept unparsable {rPath}: {exception}')
+        found, modules = shake.reachable(self._path, onError=onError)
+        if not found:
+            raise KitError(f"Kit entry 'main' not found in '{self._path}'")
+        excludes = sorted(modules - found)
+        for exclude in excludes: callback(f'Shake {exclude}')
+        callback(f'Shake dropped {len(excludes)} of {len(modules)} modules')
+        return Kit(self._path, excludes, self._manifest, self._options)
+
+    def profileImports(self, callback=lambda line: None):
+        main = pathlib.PurePath('main.py')
+        profileMain = main.with_name(bootstrap.PROFILE_MAIN + main.suffix)
+        if not (self._path / main).is_file():
+            raise KitError(f"Kit entry '{main}' not found in '{self._path}'")
+        components = {
+            (bootstrap.PROFILE_MAIN if name == main.stem else name):
+            self.componentName(rPath)
+            for name, rPath in shake.modules(self._path).items()
+            if rPath not in self._excludes and self.componentName(rPath)
+        }
+        try:
+            with open(self._path / main, 'rb') as file:
+                imports = shake.topImports(file.read())
+        except (SyntaxError, ValueError):
+            imports = []
+        (self._path / main).rename(self._path / profileMain)
+        with open(self._path / main, 'w') as file:
+            file.write(bootstrap.profileImports(components, imports))
+        def rename(dictionary):
+            dictionary = dict(dictionary)
+            if main in dictionary: dictionary[profileMain] = dictionary.pop(main)
+            return dictionary
+        callback(f"Profile imports from '{profileMain}'")
+        return Kit(self._path, self._excludes, rename(self._manifest), rename(self._options))
     
 class BuildError(ValueError): pass
 
 class Build:
 
     _COMPILE = '.compile'
+    _MINIFY = '.minify'
     _INSTALL = 'install'
     _SUFFIX = '.py'
 
     @staticmethod
-    def hash(path):
+    def hash(path, salt=''):
         blksize = os.stat(path).st_blksize
-        adler32 = zlib.adler32(b'')
+        adler32 = zlib.adler32(salt.encode('utf-8'))
         with open(path, 'rb') as file:
             while True:
                 data = file.read(blksize)
@@ -566,8 +791,32 @@ class Build:
                 adler32 = zlib.adler32(data, adler32)
         return f'{adler32:0>8X}'
 
+    _WRITE = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+
+    @staticmethod
+    def link(fromPath, toPath):
+        # The link shares the cached or kit file, so neither may be written
+        mode = os.stat(fromPath).st_mode
+        if mode & Build._WRITE: os.chmod(fromPath, mode & ~Build._WRITE)
+        try:
+            os.link(fromPath, toPath)
+        except OSError:
+            shutil.copy2(fromPath, toPath)
+
+    @staticmethod
+    def copy(fromPath, toPath):
+        # A copy is the program's own, even of a file made read-only to link
+        shutil.copy2(fromPath, toPath)
+        mode = os.stat(toPath).st_mode
+        if not mode & stat.S_IWUSR: os.chmod(toPath, mode | stat.S_IWUSR)
+
     @classmethod
-    def fromKit(cls, kit, buildPath, entryName, target, callback=lambda line: None):
+    def fromKit(
+            cls, kit, buildPath, entryName, target, callback=lambda line: None,
+            fileCallback=None,
+    ):
+        # Per-file lines may go to a separate, cheaper callback
+        fileCallback = fileCallback or callback
         compilePath = buildPath / Build._COMPILE / entryName / target.name
         cachePath = buildPath / Build._COMPILE / entryName / f'.{target.name}'
         if compilePath.is_dir():
@@ -575,63 +824,159 @@ class Build:
             compilePath.rename(cachePath)
         else:
             shutil.rmtree(compilePath, onerror=lambda type, value, tb: None )
-        sourceFromTo = []
-        copyRPaths = []
-        for directory, dirNames, fileNames in os.walk(kit.path):
-            directory = pathlib.Path(directory)
-            hPath = cachePath / directory.relative_to(kit.path)
-            cPath = compilePath / directory.relative_to(kit.path)
-            cPath.mkdir(parents=True, exist_ok=True)
-            for filePath in [pathlib.Path(fN) for fN in fileNames]:
-                if filePath.suffix == Build._SUFFIX:
-                    sourceHash = Build.hash(directory / filePath)
-                    targetFilePath = filePath.with_suffix(f'{target.suffix}.{sourceHash}')
-                    if (hPath / targetFilePath).exists():
-                        shutil.copy2(hPath / targetFilePath, cPath / targetFilePath)
-                    else:
-                        sourceFromTo.append((
-                            os.path.relpath(
-                                directory / filePath, kit.path),
-                            os.path.relpath(
-                                directory / filePath, buildPath),
-                            os.path.relpath(
-                                (cPath / targetFilePath), buildPath)
-                        ))
-                else:
-                    copyRPaths.append(directory.relative_to(kit.path) / filePath)
-            copyRPaths.extend(
-                [directory.relative_to(kit.path) / pathlib.Path(dN) for dN in dirNames]
-            )
-        if sourceFromTo:
-            with target.buildContainer(buildPath, sourceFromTo) as container:
-                for output in container.logs(stream=True):
-                    callback(output)
         installPath = buildPath / Build._INSTALL / entryName / target.name
         shutil.rmtree(installPath, onerror=lambda type, value, tb: None )
-        for directory, dirNames, fileNames in os.walk(compilePath):
-            directory = pathlib.Path(directory)
-            iPath = installPath / directory.relative_to(compilePath)
-            iPath.mkdir(parents=True, exist_ok=True)
-            for fileName in [pathlib.Path(fN) for fN in fileNames]:
-                shutil.copy2(directory / fileName, iPath / fileName.stem)
-                callback(str((iPath / fileName.stem).relative_to(buildPath)))
-        for copyRPath in copyRPaths:
-            fromPath = kit.path / copyRPath
-            toPath = installPath / copyRPath
-            if fromPath.exists():
-                if fromPath.is_file():
-                    toPath.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(fromPath, toPath)
-                elif fromPath.is_dir():
-                    toPath.mkdir(parents=True, exist_ok=True)
-                else:
-                    raise BuildError(f"File is not valid '{fromPath}'")
-            callback(toPath.relative_to(buildPath))
-        return cls(installPath, target)
+        minifyPath = buildPath / Build._MINIFY / entryName / target.name
+        shutil.rmtree(minifyPath, onerror=lambda type, value, tb: None )
+        isMinify = bool(target.minify) and minify.isSupported
+        if target.minify and not isMinify:
+            callback('Minify skipped; requires Python 3.9 or later')
+        # The compiler and the transform are part of the compile cache key
+        salt = target.compiler + (f' minify{target.minify}' if isMinify else '')
+
+        # Targets that read the tree locally or through a bind mount
+        # install hard links, so installing costs only metadata operations
+        copy = Build.link if target.isLinkInstall else Build.copy
+        def install(fromPath, toPath):
+            with Trace.span(str(fromPath), 'file', phase='install'):
+                copy(fromPath, toPath)
+            Stats.add(stats.INSTALL_FILES)
+            Stats.add(stats.INSTALL_BYTES, os.path.getsize(toPath))
+            return toPath.relative_to(buildPath)
+
+        def lookup(directory, filePath, hPath, cPath, iPath):
+            options = target.compileOptions + kit.compileOptions(
+                (directory / filePath).relative_to(kit.path)
+            )
+            with Trace.span(str(directory / filePath), 'file', phase='hash'):
+                sourceHash = Build.hash(directory / filePath, salt + ' '.join(options))
+            targetFilePath = filePath.with_suffix(f'{target.suffix}.{sourceHash}')
+            if (hPath / targetFilePath).exists():
+                os.replace(hPath / targetFilePath, cPath / targetFilePath)
+                Stats.add(stats.CACHED)
+                return None, install(cPath / targetFilePath, iPath / targetFilePath.stem), None
+            Stats.add(stats.COMPILED)
+            fromPath = directory / filePath
+            sizes = None
+            if isMinify:
+                toPath = minifyPath / directory.relative_to(kit.path) / filePath
+                with Trace.span(str(fromPath), 'file', phase='minify'):
+                    sizes = Scheduler.submit(
+                        scheduler.PROCESS, minify.minifyFile, str(fromPath), str(toPath),
+                        target.minify['asserts'], minify.isViper(options),
+                    ).result()
+                fromPath = toPath
+            return (
+                os.path.relpath(directory / filePath, kit.path),
+                os.path.relpath(fromPath, buildPath),
+                os.path.relpath(cPath / targetFilePath, buildPath),
+                options,
+            ), iPath / targetFilePath.stem, sizes
+
+        # Files stream through hash, cache lookup, compile and install as
+        # each is ready; callbacks run only on this thread
+        lookups = []
+        copies = []
+        installs = []
+        try:
+            directories = []
+            components = {}
+            for directory, dirNames, fileNames in os.walk(kit.path):
+                directory = pathlib.Path(directory)
+                rPath = directory.relative_to(kit.path)
+                hPath = cachePath / rPath
+                cPath = compilePath / rPath
+                iPath = installPath / rPath
+                cPath.mkdir(parents=True, exist_ok=True)
+                iPath.mkdir(parents=True, exist_ok=True)
+                for filePath in [pathlib.Path(fN) for fN in fileNames]:
+                    if rPath / filePath in kit.excludes:
+                        continue
+                    elif not (directory / filePath).exists():
+                        # Dangling symlinks from the kit install nothing
+                        continue
+                    elif filePath.suffix == Build._SUFFIX:
+                        lookups.append(Scheduler.submit(
+                            scheduler.CPU,
+                            lookup, directory, filePath, hPath, cPath, iPath,
+                        ))
+                        components[rPath / filePath.with_suffix(target.suffix)] = (
+                            kit.componentName(rPath / filePath)
+                        )
+                    elif (directory / filePath).is_file():
+                        copies.append(Scheduler.submit(
+                            scheduler.IO,
+                            install, directory / filePath, iPath / filePath,
+                        ))
+                        components[rPath / filePath] = kit.componentName(rPath / filePath)
+                    else:
+                        raise BuildError(f"File is not valid '{directory / filePath}'")
+                for dirName in dirNames:
+                    if (directory / dirName).is_dir():
+                        (iPath / dirName).mkdir(parents=True, exist_ok=True)
+                    directories.append((iPath / dirName).relative_to(buildPath))
+            pending = {}
+            totals = [0, 0, 0]
+            def misses():
+                # Cache misses go to the compiler as their lookups finish
+                for future in concurrent.futures.as_completed(lookups):
+                    source, installed, sizes = future.result()
+                    if sizes:
+                        totals[:] = [totals[0] + sizes[0], totals[1] + sizes[1], totals[2] + 1]
+                        fileCallback(f'Minify {source[0]} {sizes[0]} -> {sizes[1]}')
+                    if source:
+                        pending[source[2]] = installed
+                        yield source
+                    else:
+                        fileCallback(str(installed))
+            with Trace.span('compile', 'build'):
+                with target.buildContainer(
+                        buildPath, misses(), f'{entryName}@{target.name}',
+                ) as container:
+                    for output in container.logs(stream=True):
+                        fileCallback(output)
+                        for line in str(output).splitlines():
+                            compiled = line.strip().split(' -> ')[-1]
+                            if compiled in pending:
+                                installs.append(Scheduler.submit(
+                                    scheduler.IO, install, buildPath / compiled, pending.pop(compiled),
+                                ))
+            if isMinify and totals[2]:
+                callback(f'Minify {totals[2]} files {totals[0]} -> {totals[1]}')
+            installs.extend([
+                Scheduler.submit(
+                    scheduler.IO, install, buildPath / fromPath, toPath,
+                )
+                for fromPath, toPath in pending.items()
+            ])
+            for future in concurrent.futures.as_completed(installs):
+                fileCallback(str(future.result()))
+            for future in concurrent.futures.as_completed(copies):
+                fileCallback(future.result())
+            for directory in directories:
+                fileCallback(directory)
+        finally:
+            Scheduler.finish(lookups + copies + installs)
+        return cls(installPath, target, components)
+
+    @classmethod
+    def fromDictionary(cls, dictionary, target):
+        return cls(
+            pathlib.Path(dictionary['path']),
+            target,
+            {pathlib.Path(k): v for k, v in dictionary['components'].items()},
+        )
 
-    def __init__(self, path, target):
+    def __init__(self, path, target, components={}):
         self._path = path
         self._target = target
+        self._components = components
+
+    def asDictionary(self):
+        return {
+            'path': str(self._path),
+            'components': {str(k): v for k, v in self._components.items()},
+        }
 
     @property
     def path(self): return self._path
@@ -639,12 +984,90 @@ class Build:
     @property
     def target(self): return self._target
 
+    @property
+    def components(self): return self._components
+
+class Size:
+
+    _SIZE = '.size'
+    _NONE = '-'
+
+    @classmethod
+    def fromBuild(cls, build, buildPath, entryName, callback=lambda line: None, isReport=True):
+        components = {}
+        for rPath, componentName in build.components.items():
+            path = build.path / rPath
+            if path.is_file():
+                name = componentName or Size._NONE
+                components[name] = components.get(name, 0) + path.stat().st_size
+        sizePath = buildPath / Size._SIZE / entryName / f'{build.target.name}.json'
+        try:
+            with open(sizePath) as file:
+                previous = cls(**json.load(file))
+        except (OSError, ValueError, TypeError):
+            previous = None
+        size = cls(components)
+        if isReport: size.report(callback, previous, build.target.flashBudget)
+        # Only a passing build becomes the baseline for the next report
+        size.check(build.target.flashBudget, build.target.partBudgets)
+        sizePath.parent.mkdir(parents=True, exist_ok=True)
+        with open(sizePath, 'w') as file:
+            json.dump({'components': size.components}, file, indent=2)
+        return size
+
+    def __init__(self, components):
+        self._components = components
+
+    @property
+    def components(self): return self._components
+
+    @property
+    def ensembles(self):
+        ensembles = {}
+        for name, size in self._components.items():
+            ensemble = name.split('^')[0]
+            ensembles[ensemble] = ensembles.get(ensemble, 0) + size
+        return ensembles
+
+    @property
+    def total(self): return sum(self._components.values())
+
+    def report(self, callback, previous=None, budget=None):
+        def delta(size, before):
+            return '' if before is None else f'{size - before:+10d}'
+        def lines(title, sizes, befores):
+            callback(f'  {title:<32} {"bytes":>10}' + ('     delta' if previous else ''))
+            names = sorted({**befores, **sizes}, key=lambda name: -sizes.get(name, 0))
+            for name in names:
+                size = sizes.get(name, 0)
+                callback(f'  {name:<32} {size:>10d}{delta(size, befores.get(name, 0) if previous else None)}')
+        callback(
+            f'Size {self.total} bytes'
+            + (f' ({self.total - previous.total:+d})' if previous else '')
+            + (f' of budget {budget}' if budget else '')
+        )
+        lines('ensemble^part', self._components, previous.components if previous else {})
+        lines('ensemble', self.ensembles, previous.ensembles if previous else {})
+
+    def check(self, budget=None, budgets={}):
+        errors = []
+        if budget is not None and budget < self.total:
+            errors.append(f'total {self.total} exceeds flash_budget {budget}')
+        sizes = {**self.ensembles, **self._components}
+        for name, limit in budgets.items():
+            if limit < sizes.get(name, 0):
+                errors.append(f"'{name}' {sizes[name]} exceeds budget {limit}")
+        if errors: raise BuildError('Size ' + '; '.join(errors))
+
 class Install:
 
     @classmethod
     def fromBuild(cls, build, callback=lambda line: None, isQuiet=False):
         callback(f"Install {build.path}")
-        build.target.install(build.path, isQuiet=isQuiet)
+        target = build.target
+        with Scheduler.device(target.name, target.isParallel):
+            with Trace.span('install', 'target', target=target.name):
+                target.install(build.path, isQuiet=isQuiet, callback=callback)
         return cls(build)
 
     def __init__(self, build):
@@ -656,9 +1079,14 @@ class Install:
 class Runner:
 
     @classmethod
-    def fromInstall(cls, install, callback=lambda line: None, isSilent=False):
+    def fromInstall(
+            cls, install, callback=lambda line: None, isSilent=False, output=None,
+    ):
         callback(f"Run {install.build.path}")
-        install.build.target.run(install.build.path, isSilent)
+        target = install.build.target
+        with Scheduler.device(target.name, target.isParallel):
+            with Trace.span('run', 'target', target=target.name):
+                target.run(install.build.path, isSilent, output)
         return cls(install)
 
     def __init__(self, install):
@@ -0,0 +1,316 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/forkserver.py
+####
+#### synopsis:  Run ghost installs in children forked from a warm parent
+####
+#### description:
+####
+####    The server preloads modules once, then forks a child per request
+####    with the client's stdio, environment and install directory. Warm
+####    modules the install directory shadows are dropped in the child, so
+####    main imports what a cold run would. The server runs as a plain
+####    script, so it imports only the standard library, and exits after
+####    an idle period.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import sys
+
+# A cold interpreter starts with these; later imports may be shadowed
+_STARTUP = frozenset(sys.modules)
+
+import hashlib
+import importlib.machinery
+import json
+import os
+import runpy
+import selectors
+import signal
+import socket
+import stat
+import struct
+import subprocess
+import tempfile
+import time
+import traceback
+
+PRELOAD = (
+    'argparse', 'asyncio', 'collections', 'functools', 'io', 'itertools',
+    'json', 'math', 'random', 're', 'runpy', 'struct', 'threading', 'time',
+    'traceback',
+)
+IDLE = 300
+
+_START_TIMEOUT = 5.0
+_FDS = 3
+_CREDENTIALS = struct.Struct('3i')
+_STARTED = b'.'
+
+# No server could be reached, so nothing was run
+class ForkServerError(OSError): pass
+
+def isSupported():
+    return (
+        hasattr(os, 'fork')
+        and hasattr(socket, 'AF_UNIX')
+        and hasattr(socket, 'send_fds')
+        and hasattr(socket, 'SO_PEERCRED')
+    )
+
+def _directory():
+    # Private to this user: the socket carries the environment and stdio
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    path = (
+        os.path.join(runtime, 'mupy') if runtime and os.path.isabs(runtime)
+        else os.path.join(tempfile.gettempdir(), f'mupy-{os.getuid()}')
+    )
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    status = os.lstat(path)
+    if (
+            not stat.S_ISDIR(status.st_mode)
+            or status.st_uid != os.getuid()
+            or status.st_mode & 0o077
+    ):
+        raise PermissionError(f"Fork server directory '{path}' is not private")
+    return path
+
+def socketPath(preload=()):
+    key = json.dumps([sys.executable, sorted(preload), __file__])
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(_directory(), f'forkserver-{digest}.sock')
+
+def _isPeerUser(connection):
+    _, uid, _ = _CREDENTIALS.unpack(connection.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, _CREDENTIALS.size,
+    ))
+    return uid == os.getuid()
+
+def _connect(path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        if not _isPeerUser(client):
+            raise PermissionError(f"Fork server '{path}' belongs to another user")
+    except OSError:
+        client.close()
+        raise
+    return client
+
+def _spawn(path, preload, idle):
+    subprocess.Popen(
+        (sys.executable, __file__, path, str(idle), *preload),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + _START_TIMEOUT
+    while True:
+        try:
+            return _connect(path)
+        except OSError:
+            if time.monotonic() > deadline: raise
+            time.sleep(0.01)
+
+def _open(preload, idle):
+    sPath = socketPath(preload)
+    try:
+        return _connect(sPath)
+    except OSError:
+        return _spawn(sPath, preload, idle)
+
+def run(path, main, stdout, stderr, preload=(), idle=IDLE):
+    # Returns the exit status, or raises ForkServerError if the run did not
+    # start; once the server acknowledges it, other errors mean it may have
+    preload = tuple(PRELOAD) + tuple(preload)
+    request = json.dumps({
+        'path': str(path), 'main': str(main), 'environ': dict(os.environ),
+    }).encode('utf-8') + b'\n'
+    try:
+        client = _open(preload, idle)
+    except OSError as exception:
+        raise ForkServerError(f'No fork server: {exception}') from exception
+    with client:
+        try:
+            # A server exiting when idle may accept and then drop the request
+            socket.send_fds(client, [request], [0, stdout, stderr])
+            if client.recv(len(_STARTED)) != _STARTED:
+                raise ConnectionError('Fork server dropped the run')
+        except OSError as exception:
+            raise ForkServerError(f'No fork server: {exception}') from exception
+        response = b''
+        while not response.endswith(b'\n'):
+            data = client.recv(64)
+            if not data: raise ConnectionError('Fork server closed the run')
+            response += data
+        return int(response)
+
+def _evict(path):
+    # Drop warm modules the install tree shadows, so main imports its own
+    names = [
+        name for name in list(sys.modules)
+        if '.' not in name and name not in _STARTUP
+        and importlib.machinery.PathFinder.find_spec(name, [path])
+    ]
+    for name in list(sys.modules):
+        if name.partition('.')[0] in names: del sys.modules[name]
+
+def _child(request, fds):
+    for fd, target in zip(fds, range(_FDS)):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', closefd=False)
+    sys.stderr = open(2, 'w', closefd=False)
+    os.environ.clear()
+    os.environ.update(request['environ'])
+    os.chdir(request['path'])
+    sys.path[0:0] = [request['path']]
+    _evict(request['path'])
+    sys.argv = [request['main']]
+    status = 0
+    try:
+        runpy.run_path(request['main'], run_name='__main__')
+    except SystemExit as exception:
+        code = exception.code
+        if code is None: status = 0
+        elif isinstance(code, int): status = code
+        else:
+            print(code, file=sys.stderr)
+            status = 1
+    except KeyboardInterrupt:
+        status = 128 + signal.SIGINT
+    except BaseException as exception:
+        tb = exception.__traceback__
+        while tb and tb.tb_frame.f_code.co_filename in (__file__, '<frozen runpy>'):
+            tb = tb.tb_next
+        traceback.print_exception(type(exception), exception, tb)
+        status = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+    os._exit(status)
+
+def _receive(connection):
+    request, fds, _, _ = socket.recv_fds(connection, 1 << 20, _FDS)
+    while not request.endswith(b'\n'):
+        data = connection.recv(1 << 20)
+        if not data: break
+        request += data
+    return json.loads(request), fds
+
+def serve(path, idle=IDLE, preload=()):
+    for name in preload:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    try:
+        _connect(path).close()
+        return
+    except OSError:
+        pass
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, None)
+    children = {}
+    pidfd = getattr(os, 'pidfd_open', None)
+    lastActive = time.monotonic()
+    def finish(pid, status):
+        connection, fd = children.pop(pid)
+        if fd is not None:
+            selector.unregister(fd)
+            os.close(fd)
+        try:
+            selector.unregister(connection)
+        except KeyError:
+            pass
+        try:
+            connection.sendall(b'%d\n' % os.waitstatus_to_exitcode(status))
+        except OSError:
+            pass
+        connection.close()
+    try:
+        while True:
+            if not children:
+                timeout = max(0.0, idle - (time.monotonic() - lastActive))
+            else:
+                timeout = None if pidfd else 0.05
+            events = selector.select(timeout=timeout)
+            for key, _ in events:
+                if key.fileobj is listener:
+                    connection, _ = listener.accept()
+                    try:
+                        if not _isPeerUser(connection):
+                            raise PermissionError('Client belongs to another user')
+                        request, fds = _receive(connection)
+                    except (OSError, ValueError):
+                        connection.close()
+                        continue
+                    pid = os.fork()
+                    if pid == 0:
+                        listener.close()
+                        connection.close()
+                        for other, fd in children.values():
+                            other.close()
+                            if fd is not None: os.close(fd)
+                        selector.close()
+                        signal.signal(signal.SIGINT, signal.default_int_handler)
+                        _child(request, fds)
+                    for fd in fds: os.close(fd)
+                    try:
+                        connection.sendall(_STARTED)
+                    except OSError:
+                        pass
+                    fd = pidfd(pid) if pidfd else None
+                    children[pid] = (connection, fd)
+                    selector.register(connection, selectors.EVENT_READ, pid)
+                    if fd is not None:
+                        selector.register(fd, selectors.EVENT_READ, pid)
+                elif isinstance(key.fileobj, socket.socket):
+                    # The client went away, so stop its run
+                    if not key.fileobj.recv(64):
+                        selector.unregister(key.fileobj)
+                        try:
+                            os.kill(key.data, signal.SIGTERM)
+                        except ProcessLookupError:
+                            pass
+            while children:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0: break
+                if pid in children: finish(pid, status)
+            if children:
+                lastActive = time.monotonic()
+            elif time.monotonic() - lastActive > idle:
+                break
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        listener.close()
+
+if __name__ == '__main__':
+    del sys.path[0]
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    serve(sys.argv[1], float(sys.argv[2]), sys.argv[3:])
@@ -0,0 +1,136 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/graph.py
+####
+#### synopsis:  Skip build stages whose input fingerprint is unchanged
+####
+#### description:
+####
+####    Each task fingerprints its own inputs together with the
+####    fingerprints of the tasks it depends on, so an unchanged task is
+####    restored from its saved record without running its dependencies.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import hashlib
+import json
+import os
+
+from . import stats
+from .stats import Stats
+from .trace import Trace
+
+class Fingerprint:
+
+    @staticmethod
+    def ofValues(*values):
+        text = json.dumps(values, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def ofTree(path):
+        # Metadata only; a rewritten file always changes its mtime
+        digest = hashlib.sha1()
+        for directory, dirNames, fileNames in os.walk(path, followlinks=True):
+            dirNames.sort()
+            for fileName in sorted(fileNames):
+                filePath = os.path.join(directory, fileName)
+                try:
+                    stat = os.stat(filePath)
+                except OSError:
+                    continue
+                digest.update(
+                    f'{os.path.relpath(filePath, path)}\0{stat.st_size}'
+                    f'\0{stat.st_mtime_ns}\n'.encode('utf-8', 'surrogateescape')
+                )
+        return digest.hexdigest()
+
+class Task:
+
+    def __init__(
+            self, name, inputs, action, save, restore, dependencies=(),
+    ):
+        self._name = name
+        self._inputs = inputs
+        self._action = action
+        self._save = save
+        self._restore = restore
+        self._dependencies = tuple(dependencies)
+
+    @property
+    def name(self): return self._name
+
+    @property
+    def dependencies(self): return self._dependencies
+
+    def inputs(self): return self._inputs()
+
+    def action(self): return self._action()
+
+    def save(self, result): return self._save(result)
+
+    def restore(self, record): return self._restore(record)
+
+class Graph:
+
+    def __init__(self, path, isForce=False, callback=lambda line: None):
+        self._path = path
+        self._isForce = isForce
+        self._callback = callback
+        self._fingerprints = {}
+        self._results = {}
+        try:
+            with open(path) as file:
+                self._records = json.load(file)
+        except (OSError, ValueError):
+            self._records = {}
+
+    @property
+    def path(self): return self._path
+
+    def fingerprint(self, task):
+        if task.name not in self._fingerprints:
+            with Trace.span(f'fingerprint {task.name}', 'graph'):
+                self._fingerprints[task.name] = Fingerprint.ofValues(
+                    task.inputs(),
+                    [self.fingerprint(d) for d in task.dependencies],
+                )
+        return self._fingerprints[task.name]
+
+    def run(self, task):
+        if task.name in self._results: return self._results[task.name]
+        fingerprint = self.fingerprint(task)
+        record = self._records.get(task.name)
+        result = None
+        if (
+                not self._isForce
+                and record
+                and record.get('fingerprint') == fingerprint
+        ):
+            result = task.restore(record.get('record'))
+            if result is not None:
+                self._callback(f'Skip {task.name} (unchanged)')
+                Stats.add(stats.SKIPPED + task.name)
+        if result is None:
+            if self._records.pop(task.name, None): self._write()
+            result = task.action()
+            self._records[task.name] = {
+                'fingerprint': fingerprint, 'record': task.save(result),
+            }
+            self._write()
+        self._results[task.name] = result
+        return result
+
+    def _write(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self._path.with_name(self._path.name + '.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(self._records, file, indent=1, sort_keys=True)
+        os.replace(temporary, self._path)
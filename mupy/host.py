@@ -10,6 +10,7 @@ class Host:
     BUILD       = 'build'
     KIT         = 'kit'
     INSTALL     = 'install'
+    LOCK        = 'lock'
 
     @classmethod
     def fromConfiguration(cls, configuration):
@@ -17,13 +18,14 @@ class Host:
         def get(name):
             return parent / getattr(configuration.directory, name, name)
         return cls(
-            parent, get(Host.STOCK), get(Host.BUILD)
+            parent, get(Host.STOCK), get(Host.BUILD), get(Host.LOCK)
         )
 
-    def __init__(self, parent, stock, build):
+    def __init__(self, parent, stock, build, lock=None):
         self._parent = parent
         self._stockPath = stock
         self._buildPath = build
+        self._lockPath = lock or parent / Host.LOCK
 
     @property
     def parentPath(self): return self._parent
@@ -34,9 +36,13 @@ class Host:
     @property
     def buildPath(self): return self._buildPath
     
-    def kitPath(self, app):
-        return pathlib.Path(self._buildPath / Host.KIT / app.entryName)
+    def kitPath(self, app, targetName=None):
+        name = app.entryName + (f'@{targetName}' if targetName else '')
+        return pathlib.Path(self._buildPath / Host.KIT / name)
     
+    def lockPath(self, app):
+        return pathlib.Path(self._lockPath / f'{app.entryName}.lock')
+
     def installPath(self, targetName, appName):
         return pathlib.Path(self._build / Host.INSTALL / targetName / appName)
 
@@ -0,0 +1,180 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/lock.py
+####
+#### synopsis:  Save a resolved BOM so builds can skip stock resolution
+####
+#### description:
+####
+####    A lock records each component's grade, ensemble file and the part
+####    path chosen for every target, with SHA-256 hashes of the ensemble
+####    files and part contents. Loading it parses only those ensemble
+####    files, and any changed hash or tag choice rejects the lock.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import hashlib
+import json
+import os
+import pathlib
+
+from . import design
+from . import tag
+from . import version
+
+class LockError(ValueError): pass
+
+def sha256(path):
+    # A directory hashes its relative file names and contents
+    digest = hashlib.sha256()
+    def update(filePath):
+        with open(filePath, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 16), b''):
+                digest.update(chunk)
+    path = pathlib.Path(path)
+    if path.is_dir():
+        for directory, dirNames, fileNames in os.walk(path, followlinks=True):
+            dirNames.sort()
+            for fileName in sorted(fileNames):
+                filePath = pathlib.Path(directory) / fileName
+                # Builds skip dangling symlinks, so the lock does too
+                if not filePath.exists(): continue
+                digest.update(filePath.relative_to(path).as_posix().encode('utf-8') + b'\0')
+                update(filePath)
+    else:
+        update(path)
+    return digest.hexdigest()
+
+class Lock:
+
+    FORMAT = 2
+
+    @staticmethod
+    def _key(grade, name):
+        # Grades may hold ensembles of the same name
+        return f'{grade}/{name}'
+
+    @classmethod
+    def fromBOM(cls, bom, entryName, stockPath, grade, tags, targets):
+        ensembles = {}
+        parts = {}
+        tagRay = tag.TagRay.fromString(tags)
+        def lockComponent(component, arg):
+            ensemble = component.ensemble
+            key = Lock._key(ensemble.grade, ensemble.name)
+            if key not in ensembles:
+                ensembles[key] = {
+                    'grade': ensemble.grade,
+                    'name': ensemble.name,
+                    'file': ensemble.file.relative_to(stockPath).as_posix(),
+                    'path': pathlib.Path(
+                        os.path.relpath(ensemble.path, stockPath)
+                    ).as_posix(),
+                    'sha256': sha256(ensemble.file),
+                }
+            key = Lock._key(ensemble.grade, component.name)
+            if component.part.path is None or key in parts: return
+            paths = {}
+            for target in targets:
+                rPath = component.part.taggedPath(target.tagRay.plus(tagRay))
+                try:
+                    digest = sha256(ensemble.path / rPath)
+                except OSError as exception:
+                    raise LockError(
+                        f"Cannot lock '{component.name}' path '{rPath}'"
+                        f" for target '{target.name}': {exception.strerror or exception}"
+                    )
+                paths[target.name] = {'path': rPath.as_posix(), 'sha256': digest}
+            parts[key] = paths
+        bom.walk(lockComponent)
+        return cls({
+            'format': Lock.FORMAT,
+            'mupy': str(version.VERSION),
+            'entry': entryName,
+            'grade': grade,
+            'tags': tags,
+            'targets': [t.name for t in targets],
+            'ensembles': ensembles,
+            'parts': parts,
+            'bom': bom.asDictionary(),
+        })
+
+    @classmethod
+    def fromPath(cls, path):
+        try:
+            with open(path) as file:
+                dictionary = json.load(file)
+        except FileNotFoundError:
+            raise LockError(f"Lock file not found '{path}'; run 'mupy lock'")
+        except ValueError as exception:
+            raise LockError(f"Invalid lock file '{path}': {exception}")
+        if dictionary.get('format') != Lock.FORMAT:
+            raise LockError(f"Unsupported lock file format in '{path}'")
+        return cls(dictionary)
+
+    def __init__(self, dictionary):
+        self._dictionary = dictionary
+
+    def asDictionary(self): return self._dictionary
+
+    def write(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + '.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(self._dictionary, file, indent=1, sort_keys=True)
+            file.write('\n')
+        os.replace(temporary, path)
+
+    def ensemblePaths(self, stockPath):
+        # Directories holding the locked parts, for change detection
+        return sorted(set([
+            os.path.normpath(stockPath / e['path'])
+            for e in self._dictionary['ensembles'].values()
+        ]))
+
+    def bom(self, stockPath, entryName, grade, tags, target):
+        def reject(reason):
+            raise LockError(f"Lock for '{entryName}' is stale: {reason}; run 'mupy lock'")
+        locked = self._dictionary
+        if locked['entry'] != entryName: reject(f"it locks '{locked['entry']}'")
+        if locked['grade'] != grade: reject(f"it was made at grade '{locked['grade']}'")
+        tagRay = tag.TagRay.fromString(tags)
+        if tag.TagRay.fromString(locked['tags']) != tagRay:
+            reject(f"it was made with tags '{locked['tags']}'")
+        if target.name not in locked['targets']: reject(f"it has no target '{target.name}'")
+        ensembles = {}
+        for lockedEnsemble in locked['ensembles'].values():
+            mupyPath = stockPath / lockedEnsemble['file']
+            try:
+                isChanged = sha256(mupyPath) != lockedEnsemble['sha256']
+            except OSError:
+                reject(f"'{lockedEnsemble['file']}' is missing")
+            if isChanged: reject(f"'{lockedEnsemble['file']}' changed")
+            ensembles[(lockedEnsemble['grade'], lockedEnsemble['name'])] = (
+                design.Ensemble.fromPaths(stockPath / lockedEnsemble['grade'], mupyPath)
+            )
+        bom = design.BOM.fromDictionary(locked['bom'], ensembles)
+        tagRay = target.tagRay.plus(tagRay)
+        def checkComponent(component, arg):
+            lockedPaths = locked['parts'].get(
+                Lock._key(component.ensemble.grade, component.name)
+            )
+            if component.part.path is None or lockedPaths is None: return
+            lockedPath = lockedPaths[target.name]
+            rPath = component.part.taggedPath(tagRay)
+            if rPath.as_posix() != lockedPath['path']:
+                reject(f"'{component.name}' now selects '{rPath}'")
+            try:
+                isChanged = sha256(component.ensemble.path / rPath) != lockedPath['sha256']
+            except OSError:
+                reject(f"'{component.name}' path '{rPath}' is missing")
+            if isChanged: reject(f"'{component.name}' content changed")
+        bom.walk(checkComponent)
+        return bom
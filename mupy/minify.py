@@ -0,0 +1,121 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/minify.py
+####
+#### synopsis:  Strip docstrings, comments, annotations and asserts
+####
+#### description:
+####
+####    Shrink Python sources before compilation for size-constrained
+####    targets. Requires ast.unparse, available from Python 3.9.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import ast
+import os
+import shutil
+
+isSupported = hasattr(ast, 'unparse')
+
+def _isString(node):
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+_TYPED = ('viper', 'native', )
+
+def _isTyped(node):
+    # Viper and native functions take their types from the annotations
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Attribute):
+            if (isinstance(decorator.value, ast.Name)
+                and decorator.value.id == 'micropython'
+                and decorator.attr in _TYPED):
+                return True
+        elif isinstance(decorator, ast.Name) and decorator.id in _TYPED:
+            return True
+    return False
+
+def isViper(options):
+    # mpy-cross selects the emitter with '-X emit=viper' or '-Xemit=viper'
+    return any([o.rpartition('X')[2].strip() == 'emit=viper' for o in options])
+
+class _Minifier(ast.NodeTransformer):
+
+    def __init__(self, isAssert, isAnnotation):
+        self._isAssert = isAssert
+        self._isAnnotation = isAnnotation
+        self._fields = set()
+
+    # Statement lists, including try's else and finally and each handler's body
+    _BLOCKS = ('body', 'orelse', 'finalbody', )
+
+    def generic_visit(self, node):
+        # A block that held statements must keep one, or it would not parse
+        blocks = [
+            getattr(node, name) for name in _Minifier._BLOCKS
+            if isinstance(getattr(node, name, None), list) and getattr(node, name)
+        ]
+        super().generic_visit(node)
+        for block in blocks:
+            if not block: block.append(ast.Pass())
+        return node
+
+    def visit_Expr(self, node):
+        # Docstrings, and any other bare string statement
+        return None if _isString(node.value) else self.generic_visit(node)
+
+    def visit_Assert(self, node):
+        return None if self._isAssert else self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if self._isAnnotation or id(node) in self._fields:
+            return self.generic_visit(node)
+        if node.value is None: return None
+        return ast.copy_location(
+            ast.Assign(targets=[node.target], value=self.visit(node.value)), node
+        )
+
+    def visit_arg(self, node):
+        if not self._isAnnotation: node.annotation = None
+        return node
+
+    def visit_FunctionDef(self, node):
+        isAnnotation = self._isAnnotation
+        self._isAnnotation = isAnnotation or _isTyped(node)
+        if not self._isAnnotation: node.returns = None
+        try:
+            return self.generic_visit(node)
+        finally:
+            self._isAnnotation = isAnnotation
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        # Class-body annotations declare fields, e.g. for dataclass or NamedTuple
+        self._fields.update([id(n) for n in node.body if isinstance(n, ast.AnnAssign)])
+        return self.generic_visit(node)
+
+def minify(source, isAssert=False, isAnnotation=False):
+    # isAnnotation keeps every annotation, as code emitted for viper needs
+    tree = _Minifier(isAssert, isAnnotation).visit(ast.parse(source))
+    return ast.unparse(ast.fix_missing_locations(tree)) + '\n'
+
+def minifyFile(fromPath, toPath, isAssert=False, isAnnotation=False):
+    os.makedirs(os.path.dirname(toPath), exist_ok=True)
+    with open(fromPath, 'rb') as file:
+        source = file.read()
+    try:
+        text = minify(source, isAssert, isAnnotation)
+    except (SyntaxError, ValueError):
+        # Leave the error for the compiler to report
+        shutil.copy2(fromPath, toPath)
+        return len(source), len(source)
+    with open(toPath, 'w', encoding='utf-8') as file:
+        file.write(text)
+    return len(source), os.path.getsize(toPath)
@@ -19,11 +19,17 @@ targets:
     mode:       local
     type:       cpython
     tags:       +host
+#   meta:
+#     forkserver: 300
+#     preload:  [ 'asyncio' ]
 
   - name:       python
     mode:       docker
     type:       cpython
     tags:       +host
+#   meta:
+#     warm:     300
+#     link:     false   # install a copy; a linked /flash is mounted read-only
 
   - name:       unix
     mode:       docker
@@ -35,6 +41,19 @@ targets:
     meta:
       baud:     115200
       port:     "/dev/ttyACM0"
+#     minify:   {{ asserts: true }}
+#     compile:  "-O2 -march=armv7emsp"
+#     flash_budget: 262144
+#     part_budgets: {{ 'hello^demo': 8192, 'hello': 16384 }}
+#     mpy_cross: "mpy-cross"
+#     mpy_version: 6      # or 6.2 to require that exact .mpy version
+#     compress: true
+#     chunk:    512
+#     transport: webrepl
+#     host:     "192.168.4.1:8266"
+#     password: "micropython"
+#     root:     "/"
+#     window:   4
 
 version:
   name:         "{version.NAME}"
@@ -0,0 +1,118 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/progress.py
+####
+#### synopsis:  Aggregate per-file output into a rate-limited status line
+####
+#### description:
+####
+####    Messages print in full. Per-file lines only update a counter,
+####    which is redrawn at most once per interval. Either mode can also
+####    copy every line to a log file.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import sys
+import time
+
+from .quiet import Quiet
+
+AUTO = 'auto'
+PROGRESS = 'progress'
+LOG = 'log'
+MODES = (AUTO, PROGRESS, LOG, )
+
+def _text(items): return ' '.join([str(item) for item in items])
+
+class Log:
+
+    def __init__(self, path=None):
+        self._file = open(path, 'a') if path else None
+
+    def _log(self, items):
+        if self._file: self._file.write(_text(items) + '\n')
+
+    def message(self, *items, **kwargs):
+        self._log(items)
+        Quiet.qprint(*items, **kwargs)
+
+    def file(self, *lines):
+        # One file may take several lines
+        for line in lines:
+            self._log((line, ))
+            Quiet.qprint(line)
+
+    def stage(self, name): pass
+
+    def close(self):
+        if self._file: self._file.close()
+
+class Progress(Log):
+
+    _CLEAR = '\r\x1b[K'
+
+    def __init__(self, path=None, stream=None, interval=0.1):
+        super().__init__(path)
+        self._stream = stream or sys.stdout
+        self._interval = interval
+        self._name = None
+        self._count = 0
+        self._start = time.perf_counter()
+        self._drawn = 0.0
+        self._isShown = False
+
+    def _status(self):
+        seconds = time.perf_counter() - self._start
+        rate = self._count / seconds if seconds > 0 else 0.0
+        return f'{self._name or "files"}: {self._count} files {seconds:.1f}s {rate:.0f}/s'
+
+    def _clear(self):
+        if self._isShown:
+            self._stream.write(Progress._CLEAR)
+            self._isShown = False
+
+    def _draw(self):
+        if Quiet.get(): return
+        self._stream.write(Progress._CLEAR + self._status())
+        self._stream.flush()
+        self._isShown = True
+        self._drawn = time.perf_counter()
+
+    def _finish(self):
+        # Leave one summary line for each stage that handled files
+        self._clear()
+        if self._count: Quiet.qprint(self._status(), file=self._stream)
+
+    def message(self, *items, **kwargs):
+        self._log(items)
+        self._clear()
+        Quiet.qprint(*items, **kwargs)
+
+    def file(self, *lines):
+        for line in lines: self._log((line, ))
+        self._count += 1
+        if time.perf_counter() - self._drawn >= self._interval: self._draw()
+
+    def stage(self, name):
+        self._finish()
+        self._name = name
+        self._count = 0
+        self._start = time.perf_counter()
+
+    def close(self):
+        self._finish()
+        self._stream.flush()
+        super().close()
+
+def fromMode(mode, path=None, stream=None):
+    stream = stream or sys.stdout
+    if mode == AUTO:
+        mode = PROGRESS if stream.isatty() and not Quiet.get() else LOG
+    return Progress(path, stream) if mode == PROGRESS else Log(path)
@@ -0,0 +1,79 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/report.py
+####
+#### synopsis:  Write 'mupy test' results as JUnit XML or JSON
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+from collections import namedtuple
+import json
+import xml.etree.ElementTree as ElementTree
+
+PASSED = 'passed'
+FAILED = 'failed'
+ERROR = 'error'
+
+Result = namedtuple(
+    'Result',
+    ('entry', 'target', 'status', 'seconds', 'output', 'log', 'message'),
+)
+
+def counts(results):
+    return {
+        status: len([r for r in results if r.status == status])
+        for status in (PASSED, FAILED, ERROR)
+    }
+
+def asDictionary(results, seconds):
+    return {
+        'seconds': seconds,
+        **counts(results),
+        'tests': [r._asdict() for r in results],
+    }
+
+def asJUnit(results, seconds):
+    suites = ElementTree.Element('testsuites', {
+        'tests': str(len(results)),
+        'failures': str(counts(results)[FAILED]),
+        'errors': str(counts(results)[ERROR]),
+        'time': f'{seconds:.3f}',
+    })
+    for targetName in sorted(set([r.target for r in results])):
+        targetResults = [r for r in results if r.target == targetName]
+        suite = ElementTree.SubElement(suites, 'testsuite', {
+            'name': targetName,
+            'tests': str(len(targetResults)),
+            'failures': str(counts(targetResults)[FAILED]),
+            'errors': str(counts(targetResults)[ERROR]),
+            'time': f'{sum([r.seconds for r in targetResults]):.3f}',
+        })
+        for result in targetResults:
+            case = ElementTree.SubElement(suite, 'testcase', {
+                'classname': targetName,
+                'name': result.entry,
+                'time': f'{result.seconds:.3f}',
+            })
+            if result.status != PASSED:
+                failure = ElementTree.SubElement(
+                    case, 'failure' if result.status == FAILED else 'error',
+                    {'message': result.message or result.status},
+                )
+                failure.text = result.log
+            ElementTree.SubElement(case, 'system-out').text = result.output
+    return ElementTree.ElementTree(suites)
+
+def write(path, results, seconds):
+    if str(path).endswith('.xml'):
+        asJUnit(results, seconds).write(path, encoding='utf-8', xml_declaration=True)
+    else:
+        with open(path, 'w') as file:
+            json.dump(asDictionary(results, seconds), file, indent=2)
+            file.write('\n')
@@ -0,0 +1,115 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/scheduler.py
+####
+#### synopsis:  Share one --jobs budget among every stage's workers
+####
+#### description:
+####
+####    Work is submitted by kind, and each kind has one shared pool sized
+####    from the budget: cpu for hashing, compiling and shell steps, io for
+####    copies and links, process for pure Python work such as minify, and
+####    one device pool per target, serial unless the target is parallel.
+####    Work in one kind may wait on another kind, but never on its own,
+####    so the pools cannot deadlock each other. Installs and runs hold a
+####    device slot on their own thread, so Ctrl-C still reaches them.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import concurrent.futures
+import os
+import threading
+
+CPU = 'cpu'
+IO = 'io'
+PROCESS = 'process'
+DEVICE = 'device'
+
+# I/O workers mostly wait, so they may outnumber the jobs
+_IO_FACTOR = 2
+
+class SchedulerError(ValueError): pass
+
+def defaultJobs(): return os.cpu_count() or 1
+
+class Scheduler:
+
+    _lock = threading.Lock()
+    _jobs = None
+    _executors = {}
+    _slots = {}
+
+    @classmethod
+    def configure(cls, jobs=None, isReplace=True):
+        # Without isReplace a budget already in use is kept, not swapped
+        jobs = defaultJobs() if jobs is None else jobs
+        if not (isinstance(jobs, int) and jobs > 0):
+            raise SchedulerError(f'Jobs must be a positive number, not {jobs}')
+        with cls._lock:
+            if jobs == cls._jobs: return
+            if not isReplace and cls._jobs is not None:
+                raise SchedulerError(
+                    f'Jobs are already set to {cls._jobs}, not {jobs}'
+                )
+            # Running work finishes in the old pools; new work uses the new.
+            # Device slots stay, since a holder may be mid-install and a
+            # new slot would let a second caller onto a serial device
+            for executor in cls._executors.values():
+                executor.shutdown(wait=False)
+            cls._jobs = jobs
+            cls._executors = {}
+
+    @classmethod
+    def jobs(cls):
+        if cls._jobs is None: cls.configure()
+        return cls._jobs
+
+    @classmethod
+    def limit(cls, kind, isParallel=False):
+        jobs = cls.jobs()
+        return {
+            CPU: jobs,
+            IO: jobs * _IO_FACTOR,
+            PROCESS: jobs,
+            DEVICE: jobs if isParallel else 1,
+        }[kind]
+
+    @classmethod
+    def executor(cls, kind, key=None, isParallel=False):
+        limit = cls.limit(kind, isParallel)
+        with cls._lock:
+            name = (kind, key)
+            if name not in cls._executors:
+                cls._executors[name] = (
+                    concurrent.futures.ProcessPoolExecutor(limit)
+                    if kind == PROCESS
+                    else concurrent.futures.ThreadPoolExecutor(
+                        limit, thread_name_prefix=f'mupy-{kind}',
+                    )
+                )
+            return cls._executors[name]
+
+    @classmethod
+    def submit(cls, kind, fn, *args, **kwargs):
+        return cls.executor(kind).submit(fn, *args, **kwargs)
+
+    @classmethod
+    def device(cls, name, isParallel=False):
+        # A context manager; a serial target takes one caller at a time
+        limit = cls.limit(DEVICE, isParallel)
+        with cls._lock:
+            return cls._slots.setdefault(name, threading.BoundedSemaphore(limit))
+
+    @staticmethod
+    def finish(futures):
+        # Shared pools outlive a stage, so a failed stage must not leave
+        # its queued work running behind it
+        for future in futures: future.cancel()
+        concurrent.futures.wait(futures)
@@ -0,0 +1,120 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/shake.py
+####
+#### synopsis:  Find the kit modules reachable by import from the entry
+####
+#### description:
+####
+####    Static analysis only: imports by name, from-imports, relative
+####    imports and constant __import__/import_module calls. Modules
+####    that fail to parse are kept but contribute no imports.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import ast
+import os
+import pathlib
+
+_SUFFIX = '.py'
+_INIT = '__init__'
+_ROOTS = ('', 'lib', )
+
+def modules(path):
+    names = {}
+    for directory, dirNames, fileNames in os.walk(path):
+        directory = pathlib.Path(directory)
+        for fileName in fileNames:
+            rPath = (directory / fileName).relative_to(path)
+            if rPath.suffix != _SUFFIX: continue
+            for root in _ROOTS:
+                try:
+                    parts = rPath.relative_to(root).with_suffix('').parts
+                except ValueError:
+                    continue
+                if parts[-1] == _INIT: parts = parts[:-1]
+                if parts: names.setdefault('.'.join(parts), rPath)
+    return names
+
+def _isPackage(rPath): return rPath.stem == _INIT
+
+def _string(node):
+    value = getattr(node, 'value', getattr(node, 's', None))
+    return value if isinstance(value, str) else None
+
+def imports(source, name, isPackage):
+    package = name if isPackage else name.rpartition('.')[0]
+    def prefixes(dotted):
+        parts = dotted.split('.')
+        return ['.'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    names = []
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            for alias in node.names: names.extend(prefixes(alias.name))
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package.split('.') if package else []
+                base = base[:len(base) - node.level + 1]
+                module = '.'.join(base + ([node.module] if node.module else []))
+            else:
+                module = node.module or ''
+            if module: names.extend(prefixes(module))
+            names.extend([
+                f'{module}.{alias.name}' if module else alias.name
+                for alias in node.names if alias.name != '*'
+            ])
+        elif (
+                isinstance(node, ast.Call)
+                and node.args
+                and _string(node.args[0])
+                and (
+                    (isinstance(node.func, ast.Name)
+                     and node.func.id in ('__import__', 'import_module'))
+                    or
+                    (isinstance(node.func, ast.Attribute)
+                     and node.func.attr == 'import_module')
+                )
+        ):
+            names.extend(prefixes(_string(node.args[0])))
+    return names
+
+def topImports(source):
+    # (module, statement) for each absolute import at module level, in order
+    statements = []
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.Import):
+            statements.extend([
+                (alias.name, f'import {alias.name}') for alias in node.names
+            ])
+        elif (
+                isinstance(node, ast.ImportFrom) and not node.level
+                and all([alias.name != '*' for alias in node.names])
+        ):
+            statements.append((
+                node.module,
+                f"from {node.module} import {', '.join([a.name for a in node.names])}",
+            ))
+    return statements
+
+def reachable(path, entry='main', onError=lambda rPath, exception: None):
+    names = modules(path)
+    found = set()
+    queue = [entry]
+    while queue:
+        name = queue.pop()
+        rPath = names.get(name)
+        if rPath is None or rPath in found: continue
+        found.add(rPath)
+        try:
+            with open(path / rPath, 'rb') as file:
+                queue.extend(imports(file.read(), name, _isPackage(rPath)))
+        except (SyntaxError, ValueError) as exception:
+            onError(rPath, exception)
+    return found, set(names.values())
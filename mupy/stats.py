@@ -0,0 +1,130 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/stats.py
+####
+#### synopsis:  Count build work per invocation and keep a history
+####
+#### description:
+####
+####    Counters and stage timers are class-level and thread-safe, like
+####    Trace. Each invocation appends one JSON line to the history file,
+####    and 'mupy stats' compares runs of the same command and app.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import datetime
+import json
+import threading
+import time
+
+ENSEMBLES = 'stock.ensembles'
+COMPONENTS = 'kit.components'
+KIT_FILES = 'kit.files'
+KIT_BYTES = 'kit.bytes'
+SHELLS = 'kit.shells'
+COMPILED = 'build.compiled'
+CACHED = 'build.cached'
+INSTALL_FILES = 'build.installed'
+INSTALL_BYTES = 'build.installed.bytes'
+SKIPPED = 'skipped.'
+
+# Flag a run when a counter exceeds the previous comparable run by the
+# threshold ratio and by at least this much
+MINIMUMS = {
+    COMPILED: 10,
+    KIT_FILES: 100,
+    KIT_BYTES: 1 << 20,
+}
+
+def size(count):
+    for unit in ('', 'K', 'M', 'G'):
+        if count < 1024 or unit == 'G': break
+        count /= 1024
+    return f'{count:.0f}{unit}' if unit == '' else f'{count:.1f}{unit}'
+
+class _Timer:
+
+    def __init__(self, name):
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        Stats.addTime(self._name, time.perf_counter() - self._start)
+
+class Stats:
+
+    _lock = threading.Lock()
+    _counters = {}
+    _stages = {}
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._counters = {}
+            cls._stages = {}
+
+    @classmethod
+    def add(cls, name, count=1):
+        with cls._lock:
+            cls._counters[name] = cls._counters.get(name, 0) + count
+
+    @classmethod
+    def addTime(cls, name, seconds):
+        with cls._lock:
+            cls._stages[name] = cls._stages.get(name, 0.0) + seconds
+
+    @classmethod
+    def time(cls, name): return _Timer(name)
+
+    @classmethod
+    def record(cls, command, app, isOkay, seconds):
+        with cls._lock:
+            return {
+                'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                'command': command,
+                'app': app,
+                'ok': isOkay,
+                'seconds': round(seconds, 6),
+                'counters': dict(cls._counters),
+                'stages': {k: round(v, 6) for k, v in cls._stages.items()},
+            }
+
+    @staticmethod
+    def append(path, record):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as file:
+            file.write(json.dumps(record, sort_keys=True) + '\n')
+
+    @staticmethod
+    def load(path):
+        records = []
+        try:
+            with open(path) as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        pass
+        except FileNotFoundError:
+            pass
+        return records
+
+    @staticmethod
+    def regressions(record, previous, threshold):
+        flags = []
+        for name, minimum in MINIMUMS.items():
+            now = record['counters'].get(name, 0)
+            then = previous['counters'].get(name, 0)
+            if now > threshold * then and now - then >= minimum:
+                flags.append((name, then, now))
+        return flags
@@ -1,24 +1,66 @@
 import re
+import threading
 
 from . import syntax
 
 class TagRayError(ValueError): pass
 
+# Interns tag names to bit positions, in order of first use
+class _TagRegistry:
+
+    def __init__(self):
+        self._bits = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def mask(self, tags):
+        mask = 0
+        for name in tags:
+            bit = self._bits.get(name)
+            if bit is None:
+                with self._lock:
+                    bit = self._bits.setdefault(name, len(self._names))
+                    if bit == len(self._names): self._names.append(name)
+            mask |= 1 << bit
+        return mask
+
+    def names(self, mask):
+        names = []
+        bit = 0
+        while mask:
+            if mask & 1: names.append(self._names[bit])
+            mask >>= 1
+            bit += 1
+        return frozenset(names)
+
 class TagRay:
 
+    __slots__ = ('_plusMask', '_minusMask', '_len', )
+
     regex = r'[+-]' + syntax.Identifier.regex
 
+    _registry = _TagRegistry()
+    _strings = {}
+
     @classmethod
     def fromString(cls, string):
-        if string in ('', '+', '-', ): return cls.fromTags()
-        string = '+' + string if string[0] not in ('+', '-', ) else string
-        if not re.fullmatch(f'({TagRay.regex})+', string):
-            raise TagRayError(f'Invalid tag string {string}')
-        bothTags = [t for t in re.split(f'({TagRay.regex})', string) if len(t)]
-        return cls.fromTags(
-            [t[1:] for t in bothTags if t[0] == '+'],
-            [t[1:] for t in bothTags if t[0] == '-'],
-        )
+        try:
+            return cls._strings[string]
+        except KeyError:
+            pass
+        if string in ('', '+', '-', ):
+            tagRay = cls.fromTags()
+        else:
+            tagString = '+' + string if string[0] not in ('+', '-', ) else string
+            if not re.fullmatch(f'({TagRay.regex})+', tagString):
+                raise TagRayError(f'Invalid tag string {tagString}')
+            bothTags = [t for t in re.split(f'({TagRay.regex})', tagString) if len(t)]
+            tagRay = cls.fromTags(
+                [t[1:] for t in bothTags if t[0] == '+'],
+                [t[1:] for t in bothTags if t[0] == '-'],
+            )
+        cls._strings[string] = tagRay
+        return tagRay
 
     @classmethod
     def fromTags(cls, plusTags=(), minusTags=()):
@@ -30,11 +72,26 @@ class TagRay:
         if intersection: raise TagRayError(f'Plus {plusTagSet} and Minus {minusTagSet} cannot overlap {intersection}')
         return cls(plusTagSet, minusTagSet)
 
+    @classmethod
+    def _fromMasks(cls, plusMask, minusMask=0):
+        tagRay = cls.__new__(cls)
+        tagRay._plusMask = plusMask
+        tagRay._minusMask = minusMask
+        tagRay._len = bin(plusMask).count('1')
+        return tagRay
+
     def __init__(self, plusTagSet=frozenset(), minusTagSet=frozenset()):
-        self._plusTagSet = frozenset(plusTagSet)
         if bool(minusTagSet):
             raise NotImplementedError("Minus tags ('-tag') not implemented")
-        self._minusTagSet = frozenset(minusTagSet)
+        self._plusMask = TagRay._registry.mask(plusTagSet)
+        self._minusMask = TagRay._registry.mask(minusTagSet)
+        self._len = bin(self._plusMask).count('1')
+
+    @property
+    def plusTagSet(self): return TagRay._registry.names(self._plusMask)
+
+    @property
+    def minusTagSet(self): return TagRay._registry.names(self._minusMask)
 
     def __str__(self):
         def sign(s, ts):
@@ -42,30 +99,35 @@ class TagRay:
             tags.sort()
             return ''.join([s + t for t in tags])
         return (
-            sign("+", self._plusTagSet)
+            sign("+", self.plusTagSet)
             +
-            sign("-", self._minusTagSet)
+            sign("-", self.minusTagSet)
         )
 
     def plus(self, *tagRays):
-        return TagRay(
-            self._plusTagSet.union(*[tR._plusTagSet for tR in tagRays]),
-            self._minusTagSet.union(*[tR._minusTagSet for tR in tagRays]),
-        )
+        plusMask, minusMask = self._plusMask, self._minusMask
+        for tR in tagRays:
+            plusMask |= tR._plusMask
+            minusMask |= tR._minusMask
+        return TagRay._fromMasks(plusMask, minusMask)
     # Apply to MPY_TAGS, args.tags, and target.tags in Kit.fromBOM()+
 
-    def __len__(self): return len(self._plusTagSet)
+    def __len__(self): return self._len
+
+    def __hash__(self): return hash(self._plusMask)
 
-    def __lt__(self, other): return self._plusTagSet < other._plusTagSet
-    def __le__(self, other): return self._plusTagSet <= other._plusTagSet
-    def __eq__(self, other): return self._plusTagSet == other._plusTagSet
-    def __neq__(self, other): return not self._plusTagSet == other._plusTagSet
-    def __ge__(self, other): return not self._plusTagSet < other._plusTagSet
-    def __gt__(self, other): return not self._plusTagSet <= other._plusTagSet
+    def __lt__(self, other): return self <= other and self._plusMask != other._plusMask
+    def __le__(self, other): return self._plusMask & other._plusMask == self._plusMask
+    def __eq__(self, other):
+        return isinstance(other, TagRay) and self._plusMask == other._plusMask
+    def __ne__(self, other): return not self == other
+    def __ge__(self, other): return other <= self
+    def __gt__(self, other): return other < self
 
 class TagIndexError(ValueError): pass
 
 class _Entry:
+    __slots__ = ('_tagRay', '_item', )
     def __init__(self, tagRay, item):
         self._tagRay = tagRay
         self._item = item
@@ -77,8 +139,14 @@ class _Entry:
 
 class TagIndex:
 
+    __slots__ = ('_entries', '_keys', '_sizes', '_resolved', )
+
     def __init__(self, tagRayItems=()):
-        self._entries = []
+        # Allocated on first use; most parts have empty shlet and shell indexes
+        self._entries = ()
+        self._keys = None
+        self._sizes = None
+        self._resolved = None
         for tagRay, item in tagRayItems: self.add(tagRay, item)
 
     def __iter__(self): return iter(self._entries)
@@ -86,28 +154,44 @@ class TagIndex:
     def __bool__(self): return bool(len(self._entries))
 
     def add(self, tagRay, item):
-        if tagRay in [e.tagRay for e in self._entries]:
+        if self._keys is None:
+            self._keys = set()
+            self._entries = []
+        if tagRay in self._keys:
             raise TagIndexError(f'Duplicate tags {tagRay}')
         else:
+            self._keys.add(tagRay)
             self._entries.append(_Entry(tagRay, item))
+            self._sizes = None
+            self._resolved = None
+
+    def _resolve(self, tagRay):
+        # Entries grouped by tag-set size, largest first, built once
+        if self._sizes is None:
+            groups = {}
+            for entry in self._entries:
+                groups.setdefault(len(entry), []).append(entry)
+            self._sizes = [groups[size] for size in sorted(groups, reverse=True)]
+        for entries in self._sizes:
+            matches = [entry for entry in entries if entry.tagRay <= tagRay]
+            if 1 < len(matches):
+                return None, (
+                    f'Duplicates {matches[0].tagRay} and {matches[1].tagRay} for {tagRay}'
+                )
+            elif matches:
+                return matches[0].item, None
+        return None, (
+            f"Entries for '{tagRay}' not found in {[str(e.tagRay) for e in self._entries]}"
+        )
 
     def max(self, tagRay):
-        entries = sorted(
-            [entry for entry in self._entries if entry.tagRay <= tagRay],
-            key=len,
-            reverse=True,
-        )
-        if 0 == len(entries):
-            raise TagIndexError(f"Entries for '{tagRay}' not found in {[e.tagRay for e in entries]}")
-        elif (
-                1 < len(entries)
-                and
-                len(entries[0]) == len(entries[1])
-        ):
-            raise TagIndexError(
-                f'Duplicates {entries[0].tagRay} and {entries[1].tagRay} for {tagRay}'
-            )
-        return entries[0].item
+        if self._resolved is None: self._resolved = {}
+        try:
+            item, error = self._resolved[tagRay]
+        except KeyError:
+            item, error = self._resolved[tagRay] = self._resolve(tagRay)
+        if error: raise TagIndexError(error)
+        return item
 
     @property
     def count(self): return len(self._entries)
@@ -1,19 +1,33 @@
+import concurrent.futures
 import getpass
+import hashlib
 import io
+import json
 import os
 import pathlib
 import py_compile
+import re
+import shlex
 import shutil
 import subprocess
 import sys
+import tempfile
+import zlib
 
 try:
     import docker as Docker
 except ImportError:
     pass
 
+from . import bootstrap
+from . import forkserver
+from . import scheduler
+from .scheduler import Scheduler
 from . import tag
 from . import version
+from . import webrepl
+
+class ImageError(ValueError): pass
 
 class Mode:
 
@@ -36,43 +50,197 @@ class DockerMode(Mode):
 
     repository = f'{version.NAME}'
 
+    _imageIds = {}
+
     @staticmethod
     def getTag(name): return f'{DockerMode.repository}:{name}'
 
+    @staticmethod
+    def getImageId(name):
+        # The image holds the compiler, so its id names the compiler
+        if name not in DockerMode._imageIds:
+            try:
+                DockerMode._imageIds[name] = (
+                    Docker.from_env().images.get(DockerMode.getTag(name)).id
+                )
+            except Docker.errors.ImageNotFound:
+                return DockerMode.getTag(name)
+        return DockerMode._imageIds[name]
+
+    @staticmethod
+    def getName(prefix, key):
+        # Distinct per build or install path, so containers can run in parallel
+        digest = hashlib.sha1(str(key).encode('utf-8')).hexdigest()[:12]
+        return f'{prefix}-{digest}'
+
     class Container:
 
-        def __init__(self, type, name, args, stopTimeout=1, **kwargs):
+        def __init__(
+                self, type, name, args, stopTimeout=1, autoRemove=True,
+                removes=(), **kwargs
+        ):
             self._stopTimeout = stopTimeout
-            docker = Docker.from_env()
-            self._container = docker.containers.run(
-                DockerMode.getTag(type),
-                args,
-                detach=True,
-                name=name,
-                network_mode='host',
-                auto_remove=True,
-                stderr=True,
-                stdout=True,
-                **kwargs
-            )
+            self._autoRemove = autoRemove
+            self._removes = removes
+            self._isInterrupted = False
+            try:
+                docker = Docker.from_env()
+                self._container = docker.containers.run(
+                    DockerMode.getTag(type),
+                    args,
+                    detach=True,
+                    name=name,
+                    network_mode='host',
+                    auto_remove=autoRemove,
+                    stderr=True,
+                    stdout=True,
+                    **kwargs
+                )
+            except BaseException:
+                self._remove()
+                raise
+
+        def _remove(self):
+            # Host files written only for this container
+            for path in self._removes:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
 
         def __enter__(self):
             return self
 
         def __exit__(self, exc_type, exc_value, exc_traceback):
-            self._container.stop(timeout=self._stopTimeout)
+            try:
+                self._container.stop(timeout=self._stopTimeout)
+                if not self._autoRemove:
+                    try:
+                        self._container.remove(force=True)
+                    except Docker.errors.NotFound:
+                        pass
+            finally:
+                self._remove()
+
+        def status(self):
+            # Reliable only without auto-remove, which may win the race
+            if self._isInterrupted: return None
+            try:
+                return self._container.wait()['StatusCode']
+            except Docker.errors.NotFound:
+                return None
 
         def logs(self, *args, **kwargs):
             try:
                 for output in self._container.logs(*args, **kwargs):
                     yield output.decode('utf-8')
             except KeyboardInterrupt:
-                pass
+                self._isInterrupted = True
             
 
+    class WarmContainer:
+
+        # The container stops itself once no run has touched the marker
+        # for the idle period; a run in progress keeps it alive
+        _MARKER = '/tmp/mupy-warm'
+        _RUNNING = '/tmp/mupy-run.'
+        _KEEPER = '''
+touch {marker}
+while sleep 1; do
+    ls {running}* >/dev/null 2>&1 && touch {marker}
+    [ $(( $(date +%s) - $(stat -c %Y {marker}) )) -ge {idle} ] && exit 0
+done
+'''
+        _RUN = '''
+touch {running}$$
+"$@"
+status=$?
+rm -f {running}$$
+touch {marker}
+exit $status
+'''
+
+        @staticmethod
+        def getName(type, key):
+            return DockerMode.getName(f'{version.NAME}-{type}-warm', key)
+
+        def __init__(self, type, name, idle, volumes):
+            self._type = type
+            self._name = name
+            self._idle = idle
+            self._volumes = volumes
+            self._docker = Docker.from_env()
+            self._container = None
+            self._status = None
+
+        def _start(self):
+            image = self._docker.images.get(DockerMode.getTag(self._type))
+            try:
+                container = self._docker.containers.get(self._name)
+                container.reload()
+                if container.status == 'running' and container.image.id == image.id:
+                    return container
+                container.remove(force=True)
+            except Docker.errors.NotFound:
+                pass
+            keeper = DockerMode.WarmContainer._KEEPER.format(
+                marker=DockerMode.WarmContainer._MARKER,
+                running=DockerMode.WarmContainer._RUNNING,
+                idle=int(self._idle),
+            )
+            return self._docker.containers.run(
+                image.id,
+                ['sh', '-c', keeper],
+                detach=True,
+                name=self._name,
+                network_mode='host',
+                auto_remove=True,
+                volumes=self._volumes,
+            )
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, exc_traceback):
+            pass
+
+        def execute(self, args, workdir, environment=None):
+            script = DockerMode.WarmContainer._RUN.format(
+                marker=DockerMode.WarmContainer._MARKER,
+                running=DockerMode.WarmContainer._RUNNING,
+            )
+            command = ['sh', '-c', script, 'mupy-run', *args]
+            api = self._docker.api
+            for attempt in (1, 2):
+                try:
+                    if self._container is None: self._container = self._start()
+                    execId = api.exec_create(
+                        self._container.id, command, workdir=workdir,
+                        environment=environment,
+                    )['Id']
+                    output = api.exec_start(execId, stream=True)
+                    break
+                except Docker.errors.APIError:
+                    # Reaped between lookup and exec, or a racing start
+                    self._container = None
+                    if attempt == 2: raise
+            try:
+                for chunk in output:
+                    yield chunk.decode('utf-8')
+            except KeyboardInterrupt:
+                return
+            self._status = api.exec_inspect(execId)['ExitCode']
+
+        def status(self): return self._status
+
     @staticmethod
     def removeAllImages(callback=lambda line: None):
         docker = Docker.from_env()
+        for container in docker.containers.list(
+                filters={'name': f'{version.NAME}-.*-warm-'}
+        ):
+            container.remove(force=True)
+            callback(f'Removed Docker container {container.name}')
         for image in docker.images.list(
                 name=DockerMode.repository
         ):
@@ -86,26 +254,84 @@ class DockerMode(Mode):
     @property
     def tag(self): return DockerMode.getTag(self.name)
 
+    _LABEL = f'{version.NAME}.dockerfile'
+    _CHUNK = 1 << 20
+
     def __init__(self, name, dockerfile, message=None):
         super().__init__(name)
         self._dockerfile = dockerfile
         self._message = message
 
-    def install(self, callback=lambda line: None):
+    @property
+    def digest(self):
+        return hashlib.sha256(self._dockerfile.encode('utf-8')).hexdigest()
+
+    def _image(self, docker):
+        try:
+            return docker.images.get(self.tag)
+        except Docker.errors.ImageNotFound:
+            return None
+
+    def isCurrent(self, image):
+        return image is not None and image.labels.get(DockerMode._LABEL) == self.digest
+
+    def install(self, callback=lambda line: None, isForce=False):
         docker = Docker.from_env()
+        image = self._image(docker)
+        if not isForce and self.isCurrent(image):
+            callback(f'Docker image {self.tag} {image.short_id.split(":")[1]} is current')
+            return
         if self._message:
             callback(f'Installing Docker image {self.tag}; {self._message}...')
         image, _ = docker.images.build(
             fileobj=io.BytesIO(self._dockerfile.encode('utf-8')),
             tag=f'{self.tag}',
+            labels={DockerMode._LABEL: self.digest},
             rm=True,
         )
         callback(f'Installed Docker image {self.tag} {image.short_id.split(":")[1]}')
 
+    def export(self, path, callback=lambda line: None):
+        docker = Docker.from_env()
+        image = self._image(docker)
+        if image is None:
+            raise ImageError(f"Missing Docker image {self.tag}; run setup first")
+        tarPath = pathlib.Path(path) / f'{self.name}.tar'
+        with open(tarPath, 'wb') as file:
+            for chunk in image.save(chunk_size=DockerMode._CHUNK, named=True):
+                file.write(chunk)
+        callback(f'Exported Docker image {self.tag} to {tarPath}')
+
+    def load(self, path, callback=lambda line: None):
+        docker = Docker.from_env()
+        tarPath = pathlib.Path(path) / f'{self.name}.tar'
+        if not tarPath.is_file():
+            raise ImageError(f"Missing Docker image file '{tarPath}'")
+        with open(tarPath, 'rb') as file:
+            docker.images.load(file)
+        image = self._image(docker)
+        callback(
+            f'Imported Docker image {self.tag} from {tarPath}'
+            + ('' if self.isCurrent(image) else '; Dockerfile differs, rerun setup')
+        )
+
 class TargetConfigurationError(ValueError): pass
+class CrossCompileError(ValueError): pass
+
+def _optimizeLevel(options):
+    # CPython honours only -O and -OO, or -O<level>, of the compile options
+    level = -1
+    for option in options:
+        match = re.fullmatch(r'-(O+)|-O([0-9])', option)
+        if match:
+            level = min(2, len(match.group(1)) if match.group(1) else int(match.group(2)))
+    return level
 
 class Target:
 
+    _LINK = False
+    _PARALLEL = True
+
     @staticmethod
     def fromConfiguration(configuration, name=None):
         nullC = {
@@ -144,11 +370,33 @@ class Target:
         except KeyError:
             raise TargetConfigurationError(f"Unknown target type: '{type}'")
 
-    def __init__(self, name, type, precompile, tagRay):
+    def __init__(self, name, type, precompile, tagRay, meta={}):
         self._name = name
         self._type = type
         self._precompile = precompile
         self._tagRay = tagRay
+        self._isLinkInstall = meta.get('link', self._LINK)
+        minify = meta.get('minify', False)
+        self._minify = None if not minify else {
+            'asserts': bool(isinstance(minify, dict) and minify.get('asserts')),
+        }
+        options = meta.get('compile', ())
+        options = shlex.split(options) if isinstance(options, str) else options
+        if not all([isinstance(o, str) for o in options]):
+            raise TargetConfigurationError(
+                f"Compile options must be a string or list of strings for target '{name}'"
+            )
+        self._compileOptions = tuple(options)
+        self._flashBudget = meta.get('flash_budget')
+        self._partBudgets = meta.get('part_budgets', {}) or {}
+        if not (
+                (self._flashBudget is None or isinstance(self._flashBudget, int))
+                and
+                all([isinstance(b, int) for b in self._partBudgets.values()])
+        ):
+            raise TargetConfigurationError(
+                f"Size budgets must be whole numbers of bytes for target '{name}'"
+            )
 
     @property
     def name(self): return self._name
@@ -162,13 +410,36 @@ class Target:
     @property
     def tagRay(self): return self._tagRay
 
+    @property
+    def isLinkInstall(self): return self._isLinkInstall
+
+    @property
+    def isParallel(self): return self._PARALLEL
+
+    @property
+    def minify(self): return self._minify
+
+    @property
+    def compileOptions(self): return self._compileOptions
+
+    @property
+    def flashBudget(self): return self._flashBudget
+
+    @property
+    def partBudgets(self): return self._partBudgets
+
     @property
     def suffix(self): return (
             ('.pyc' if self._type == 'cpython' else '.mpy') if self._precompile
             else '.py'
     )
 
-    def buildContainer(self, buildPath, sourceFromTo):
+    @property
+    def compiler(self):
+        # Identifies the compiler and its full version for the compile cache
+        raise NotImplementedError()
+
+    def buildContainer(self, buildPath, sourceFromTo, buildName):
         raise NotImplementedError()
 
     def install(self, *args, **kwargs):
@@ -180,60 +451,115 @@ class Target:
 
 class LocalTarget(Target):
 
+    _LINK = True
+
     class Container:
 
+        def __init__(self, operations):
+            self._operations = operations
+
         def __enter__(self):
             return self
 
         def __exit__(self, exc_type, exc_value, exc_traceback):
             pass
 
-        @property
-        def output(self):
-            self._outputs = []
-            return self._outputs
-
         def logs(self, *args, **kwargs):
-            for output in self._outputs:
-                yield output
+            # Compile lazily so that each output overlaps the caller's work
+            for operation in self._operations:
+                yield operation()
 
     @property
     def suffix(self): return '.pyc' if self._precompile else '.py'
 
+    @property
+    def compiler(self):
+        return f'{sys.executable} {sys.version}' if self._precompile else 'copy'
+
     def __init__(self, name, type, precompile, tagRay, meta):
-        super().__init__(name, type, precompile, tagRay)
-        self._container = LocalTarget.Container()
-
-    def buildContainer(self, buildPath, sourceFromTo):
-        output = self._container.output
-        for sourcePath, fromPath, toPath in sourceFromTo:
-            if self._precompile:
-                py_compile.compile(buildPath/fromPath, buildPath/toPath)
-            else:
-                # TODO precompile: false
-                shutil.copy2(buildPath/sourcePath, toPath)
-            output.append(toPath)
-        return self._container
-
-    def install(self, path, isQuiet=False):
+        super().__init__(name, type, precompile, tagRay, meta)
+        idle = meta.get('forkserver', False)
+        if idle is True: idle = forkserver.IDLE
+        preload = meta.get('preload', [])
+        if (
+                (idle and not (isinstance(idle, int) and idle > 0))
+                or not all([isinstance(p, str) for p in preload])
+        ):
+            raise TargetConfigurationError(
+                f"Forkserver must be true, false or idle seconds"
+                f" and preload a list of modules for target '{name}'"
+            )
+        self._forkserver = idle if idle and forkserver.isSupported() else None
+        self._preload = tuple(preload)
+
+    def buildContainer(self, buildPath, sourceFromTo, buildName):
+        def operation(sourcePath, fromPath, toPath, options):
+            def _operation():
+                if self._precompile:
+                    py_compile.compile(
+                        buildPath/fromPath, buildPath/toPath,
+                        optimize=_optimizeLevel(options),
+                    )
+                else:
+                    shutil.copy2(buildPath/fromPath, buildPath/toPath)
+                return toPath
+            return _operation
+        return LocalTarget.Container((operation(*sFT) for sFT in sourceFromTo))
+
+    def install(self, path, isQuiet=False, callback=print):
         pass
 
-    def run(self, path, isSilent=False):
-        try:
+    def _forkRun(self, path, main, stdout):
+        # None when no fork server is reachable, so the caller falls back;
+        # a failure after the request went out must not run main twice
+        with open(os.devnull, 'w') as devnull:
+            fd = {
+                None: lambda: sys.stdout.fileno(),
+                subprocess.DEVNULL: lambda: devnull.fileno(),
+            }.get(stdout, lambda: stdout)()
+            sys.stdout.flush()
+            try:
+                return forkserver.run(
+                    path, main, fd, fd, self._preload, self._forkserver,
+                )
+            except forkserver.ForkServerError:
+                return None
+
+    def _run(self, path, stdout):
+        main = (path/'main').with_suffix(self.suffix)
+        status = self._forkRun(path, main, stdout) if self._forkserver else None
+        if status is None:
             subprocess.run(
-                (sys.executable, (path/'main').with_suffix(self.suffix), ),
+                (sys.executable, main, ),
                 cwd=path,
                 check=True,
-                stdout=subprocess.DEVNULL if isSilent else None,
+                stdout=stdout,
                 stderr=subprocess.STDOUT,
             )
+        elif status:
+            raise subprocess.CalledProcessError(status, (sys.executable, main, ))
+
+    def run(self, path, isSilent=False, output=None):
+        try:
+            if output:
+                with tempfile.TemporaryFile() as capture:
+                    try:
+                        self._run(path, capture.fileno())
+                    finally:
+                        capture.seek(0)
+                        output(capture.read().decode('utf-8', 'replace'))
+                return
+            self._run(path, subprocess.DEVNULL if isSilent else None)
         except KeyboardInterrupt:
             pass
         if not isSilent: print()
 
 class CrossTarget(Target):
 
+    _PARALLEL = False
     _RSHELL = 'rshell'
+    _WEBREPL = 'webrepl'
+    _TRANSPORTS = (_RSHELL, _WEBREPL, )
 
     @staticmethod
     def isInstalled(onError):
@@ -246,20 +572,159 @@ class CrossTarget(Target):
                 " Please install"
             )
 
+    _MPY_CROSS = 'mpy-cross'
+    _identities = {}
+
+    class NativeContainer:
+
+        def __init__(self, operations):
+            self._operations = operations
+            self._futures = []
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, exc_traceback):
+            Scheduler.finish(self._futures)
+
+        def logs(self, *args, **kwargs):
+            # Operations may still be arriving, so yield whatever is done
+            # between submissions
+            running = set()
+            for operation in self._operations:
+                future = Scheduler.submit(scheduler.CPU, operation)
+                self._futures.append(future)
+                running.add(future)
+                for done in [f for f in running if f.done()]:
+                    running.discard(done)
+                    yield done.result()
+            for future in concurrent.futures.as_completed(running):
+                yield future.result()
+
+    @staticmethod
+    def mpyIdentity(mpyCross):
+        # e.g. 'MicroPython v1.22.0 on 2023-12-27; mpy-cross emitting mpy v6.2'
+        if mpyCross not in CrossTarget._identities:
+            try:
+                completed = subprocess.run(
+                    (mpyCross, '--version'),
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    text=True, timeout=10,
+                )
+                identity = completed.stdout.strip() or None
+            except (OSError, subprocess.SubprocessError):
+                identity = None
+            CrossTarget._identities[mpyCross] = identity
+        return CrossTarget._identities[mpyCross]
+
+    @staticmethod
+    def mpyVersion(mpyCross):
+        # The full .mpy format version, e.g. '6.2'
+        match = re.search(
+            r'\bmpy v([0-9]+(?:\.[0-9]+)*)', CrossTarget.mpyIdentity(mpyCross) or '',
+        )
+        return match.group(1) if match else None
+
     def __init__(self, name, type, precompile, tagRay, meta={}):
-        super().__init__(name, type, precompile, tagRay)
+        super().__init__(name, type, precompile, tagRay, meta)
         self._baud = meta.get('baud', 115200)
         self._port = meta.get('port', '/dev/ttyACM0')
+        self._mpyCross = meta.get('mpy_cross')
+        self._mpyVersion = meta.get('mpy_version')
+        self._compress = bool(meta.get('compress', False))
+        self._chunk = meta.get('chunk', 512)
+        self._transport = meta.get('transport', CrossTarget._RSHELL)
+        self._host = meta.get('host')
+        self._password = str(meta.get('password', ''))
+        self._root = meta.get('root', '/')
+        self._window = meta.get('window', webrepl.WINDOW)
+        if self._transport not in CrossTarget._TRANSPORTS:
+            raise TargetConfigurationError(
+                f"Transport must be one of {', '.join(CrossTarget._TRANSPORTS)}"
+                f" for target '{name}'"
+            )
+        if self._transport == CrossTarget._WEBREPL and not (
+                self._host and isinstance(self._window, int) and self._window > 0
+        ):
+            raise TargetConfigurationError(
+                f"WebREPL needs a host and a positive window for target '{name}'"
+            )
+        if not (isinstance(self._chunk, int) and self._chunk > 0):
+            raise TargetConfigurationError(
+                f"Chunk must be a positive number of bytes for target '{name}'"
+            )
+        if not (
+                (self._mpyCross is None or isinstance(self._mpyCross, (str, bool)))
+                and
+                (self._mpyVersion is None or isinstance(self._mpyVersion, (int, float, str)))
+        ):
+            raise TargetConfigurationError(
+                f"mpy_cross must be a path or false and mpy_version a version"
+                f" for target '{name}'"
+            )
+        if self._mpyVersion is not None: self._mpyVersion = str(self._mpyVersion)
+
+    @property
+    def nativeMpyCross(self):
+        # A configured path is trusted unless its version disagrees; one
+        # found on PATH is used only when it matches the required version
+        if self._mpyCross is False: return None
+        configured = isinstance(self._mpyCross, str)
+        mpyCross = shutil.which(
+            self._mpyCross if configured else CrossTarget._MPY_CROSS
+        )
+        if mpyCross is None: return None
+        version = CrossTarget.mpyVersion(mpyCross)
+        if self._mpyVersion is None:
+            return mpyCross if configured else None
+        # mpy_version 6 accepts any 6.x; 6.2 only 6.2
+        return mpyCross if version and (
+            version == self._mpyVersion or version.startswith(self._mpyVersion + '.')
+        ) else None
 
-    def buildContainer(self, buildPath, sourceFromTo):
+    @property
+    def compiler(self):
+        if not self._precompile: return 'copy'
+        mpyCross = self.nativeMpyCross
+        if mpyCross: return f'{mpyCross} {CrossTarget.mpyIdentity(mpyCross)}'
+        return DockerMode.getImageId(self.type)
+
+    def _nativeContainer(self, buildPath, sourceFromTo, mpyCross):
+        def operation(sourcePath, fromPath, toPath, options):
+            def _operation():
+                if not self._precompile:
+                    shutil.copy2(buildPath/fromPath, buildPath/toPath)
+                    return toPath
+                completed = subprocess.run(
+                    (mpyCross, '-s', str(sourcePath), *options,
+                     '-o', str(buildPath/toPath), str(buildPath/fromPath)),
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                )
+                if completed.returncode:
+                    raise CrossCompileError(
+                        f"{mpyCross} failed for '{sourcePath}'\n{completed.stdout}"
+                    )
+                return toPath
+            return _operation
+        return CrossTarget.NativeContainer((operation(*sFT) for sFT in sourceFromTo))
+
+    def buildContainer(self, buildPath, sourceFromTo, buildName):
+        mpyCross = self.nativeMpyCross if self._precompile else True
+        if mpyCross:
+            return self._nativeContainer(buildPath, sourceFromTo, mpyCross)
+        # A container compiles a whole list, so it waits for every miss
+        sourceFromTo = list(sourceFromTo)
+        if not sourceFromTo: return LocalTarget.Container(())
         baseName = os.path.basename(buildPath)
         containerPath = pathlib.Path('/' + baseName)
-        script = '.compile.sh'
+        # Builds share the directory, so each writes its own script
+        script = f'.compile-{buildName}.sh'
         with open(buildPath / script, 'w') as scriptFile:
             cP = containerPath
-            for sP, fP, tP in sourceFromTo:
+            for sP, fP, tP, options in sourceFromTo:
+                options = ''.join([f' {shlex.quote(o)}' for o in options])
                 scriptFile.write(
-                    f'mpy-cross -s {sP} -o {cP / tP} {cP / fP}\n'
+                    f'mpy-cross -s {sP}{options} -o {cP / tP} {cP / fP}\n'
                     if self._precompile
                     else
                     f'cp --preserve=all {cP / fP} {(cP / tP).parent / os.path.basename(tP)}\n'
@@ -273,53 +738,259 @@ class CrossTarget(Target):
             'working_dir': str(containerPath),
         }
         return DockerMode.Container(
-            self.type, f'{self.type}-build', args, **kwargs,
+            self.type,
+            DockerMode.getName(f'{self.type}-build', buildPath / buildName),
+            args,
+            removes=(buildPath / script, ),
+            **kwargs,
         )
 
-    def _rshellCommand(self, command, isQuiet=False):
-        subprocess.run(
+    def _rshellCommand(self, command, isQuiet=False, output=None):
+        completed = subprocess.run(
             (
                 CrossTarget._RSHELL,
                 '--baud', str(self._baud), '--port', self._port,
                 command,
             ),
-            check=True,
-            stdout=subprocess.DEVNULL if isQuiet else None,
+            check=not output,
+            stdout=(
+                subprocess.PIPE if output
+                else subprocess.DEVNULL if isQuiet else None
+            ),
             stderr=subprocess.STDOUT,
         )
+        if output:
+            output(completed.stdout.decode('utf-8', 'replace'))
+            completed.check_returncode()
 
-    def install(self, path, isQuiet=False):
+    def _stageCompressed(self, path, stagePath, root, installed):
+        # The stage persists between installs. Plain files are linked in
+        # with their mtimes, so rsync skips unchanged ones; compressible
+        # files already inflated on the device are listed but not staged
+        zPath = stagePath / bootstrap.INFLATE_DIRECTORY
+        shutil.rmtree(zPath, ignore_errors=True)
+        zPath.mkdir(parents=True)
+        helperPath = stagePath / f'{bootstrap.INFLATE_MODULE}.py'
+        lines = [f'chunk {self._chunk}']
+        record = {}
+        plainPaths = set([helperPath])
+        sizes = [0, 0]
+        for directory, dirNames, fileNames in os.walk(path):
+            directory = pathlib.Path(directory)
+            for fileName in fileNames:
+                rPath = (directory / fileName).relative_to(path)
+                name = rPath.as_posix()
+                with open(directory / fileName, 'rb') as file:
+                    data = file.read()
+                compressor = zlib.compressobj(
+                    9, zlib.DEFLATED, bootstrap.INFLATE_WBITS,
+                )
+                compressed = compressor.compress(data) + compressor.flush()
+                sizes[0] += len(data)
+                if len(compressed) < len(data):
+                    record[name] = f'{zlib.adler32(data):0>8X} {len(data)}'
+                    if installed.get(name) == record[name]:
+                        lines.append(f'keep {len(data)} {name}')
+                        continue
+                    toPath = zPath / (name + bootstrap.INFLATE_SUFFIX)
+                    toPath.parent.mkdir(parents=True, exist_ok=True)
+                    with open(toPath, 'wb') as file:
+                        file.write(compressed)
+                    lines.append(f'inflate {len(data)} {name}')
+                    sizes[1] += len(compressed)
+                else:
+                    toPath = stagePath / rPath
+                    toPath.parent.mkdir(parents=True, exist_ok=True)
+                    try:
+                        os.remove(toPath)
+                    except FileNotFoundError:
+                        pass
+                    try:
+                        os.link(directory / fileName, toPath)
+                    except OSError:
+                        shutil.copy2(directory / fileName, toPath)
+                    plainPaths.add(toPath)
+                    sizes[1] += len(data)
+        for directory, dirNames, fileNames in os.walk(stagePath):
+            directory = pathlib.Path(directory)
+            if directory == zPath or zPath in directory.parents: continue
+            for fileName in fileNames:
+                if directory / fileName not in plainPaths:
+                    os.remove(directory / fileName)
+        with open(zPath / bootstrap.INFLATE_MANIFEST, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        with open(helperPath, 'w') as file:
+            file.write(bootstrap.inflate(root))
+        return sizes, record
+
+    @staticmethod
+    def _inflateReport(text):
+        # 'ok', 'stale' or 'unsupported', or None when the helper failed
+        reports = [
+            line.split() for line in text.splitlines()
+            if line.strip().startswith(bootstrap.INFLATE_MARKER)
+        ]
+        return reports[-1][1] if reports and len(reports[-1]) > 1 else None
+
+    # A fresh import, since the device may still hold an earlier helper
+    _INFLATE = (
+        'import sys',
+        f'sys.modules.pop({bootstrap.INFLATE_MODULE!r}, None)',
+        f'import {bootstrap.INFLATE_MODULE}',
+        f'{bootstrap.INFLATE_MODULE}.main()',
+    )
+
+    def _installCompressed(self, path, root, callback, send, inflate):
+        # False when the device cannot inflate, so the caller falls back
+        stagePath = path.parent / f'.{path.name}{bootstrap.INFLATE_SUFFIX}'
+        recordPath = stagePath.with_name(stagePath.name + '.json')
+        try:
+            with open(recordPath) as file:
+                installed = json.load(file)
+        except (OSError, ValueError):
+            installed = {}
+        try:
+            os.remove(recordPath)
+        except FileNotFoundError:
+            pass
+        # A device that lost files inflated earlier gets every file again
+        for installed in ([installed, {}] if installed else [{}]):
+            (before, after), record = self._stageCompressed(
+                path, stagePath, root, installed,
+            )
+            callback(f'Compressed install {before} -> {after} bytes')
+            send(stagePath)
+            report = CrossTarget._inflateReport(inflate())
+            if report == 'ok':
+                with open(recordPath, 'w') as file:
+                    json.dump(record, file)
+                return True
+            if report != 'stale': break
+            callback('Compressed install found changed files on the device; sending all')
+        callback(
+            'Compressed install unsupported by the firmware; copying plain files'
+            if report == 'unsupported' else
+            'Compressed install failed on the device; copying plain files'
+        )
+        return False
+
+    def _inflateRshell(self):
+        lines = []
+        try:
+            self._rshellCommand(
+                f"repl ~ {' ~ '.join(CrossTarget._INFLATE)} ~", output=lines.append,
+            )
+        except subprocess.CalledProcessError:
+            pass
+        return ''.join(lines)
+
+    def _webrepl(self):
+        return webrepl.Session(
+            self._host, password=self._password, window=self._window,
+        )
+
+    def _installWebREPL(self, path, isQuiet, callback):
+        # One session carries the staged tree, the inflate and any fallback
+        fileCallback = (lambda name: None) if isQuiet else callback
+        root = self._root.rstrip('/')
+        with self._webrepl() as session:
+            if self._compress and self._installCompressed(
+                    path, root, callback,
+                    lambda stagePath: session.install(stagePath, root, fileCallback),
+                    lambda: session.execute('\n'.join(CrossTarget._INFLATE) + '\n'),
+            ): return
+            session.install(path, root, fileCallback)
+
+    def install(self, path, isQuiet=False, callback=print):
+        if self._transport == CrossTarget._WEBREPL:
+            return self._installWebREPL(path, isQuiet, callback)
+        if self._compress and self._installCompressed(
+                path, '/flash', callback,
+                lambda stagePath: self._rshellCommand(
+                    f'rsync {stagePath} /flash', isQuiet=isQuiet,
+                ),
+                self._inflateRshell,
+        ): return
         self._rshellCommand(f'rsync {path} /flash', isQuiet=isQuiet)
 
-    def run(self, path, isSilent=False):
+    def _runWebREPL(self, isSilent, output):
+        write = output or (
+            (lambda text: None) if isSilent
+            else lambda text: print(text, end='', flush=True)
+        )
+        with self._webrepl() as session:
+            try:
+                session.run('main', write)
+            except KeyboardInterrupt:
+                session.interrupt()
+
+    def run(self, path, isSilent=False, output=None):
+        if self._transport == CrossTarget._WEBREPL:
+            return self._runWebREPL(isSilent, output)
         try:
-            self._rshellCommand('repl ~ import main ~', isQuiet=isSilent)
+            self._rshellCommand('repl ~ import main ~', isSilent, output)
         except KeyboardInterrupt:
             pass
 
 class DockerTarget(CrossTarget):
 
+    _LINK = True
+    _PARALLEL = True
+    _WARM = 300
+
     def __init__(self, name, type, precompile, tagRay, meta):
-        super().__init__(name, type, precompile, tagRay)
+        super().__init__(name, type, precompile, tagRay, meta)
+        warm = meta.get('warm', False)
+        if warm is True: warm = DockerTarget._WARM
+        if warm and not (isinstance(warm, int) and warm > 0):
+            raise TargetConfigurationError(
+                f"Warm must be true, false or idle seconds for target '{name}'"
+            )
+        self._warm = warm or None
 
-    def buildContainer(self, buildPath, sourceFromTo):
+    @property
+    def warm(self): return self._warm
+
+    @property
+    def _runMode(self):
+        # Linked files share the compile cache, and root in the container
+        # ignores their read-only mode, so /flash mounts read-only; a
+        # target with 'link: false' installs a writable copy instead
+        return 'ro' if self._isLinkInstall else 'rw'
+
+    @property
+    def compiler(self):
+        if self.type != 'cpython': return super().compiler
+        return DockerMode.getImageId(self.type) if self._precompile else 'copy'
+
+    def buildContainer(self, buildPath, sourceFromTo, buildName):
         if self.type == 'cpython':
             moduleName = os.path.basename(buildPath)
-            with open(buildPath / '__init__.py', 'w') as moduleFile:
-                moduleFile.write(f'sourceFromTo = {sourceFromTo}')
-            operation = (
-                'from py_compile import compile' if self._precompile
-                else 'from shutil import copy'
+            sourceFromTo = [
+                (sP, fP, tP, _optimizeLevel(options))
+                for sP, fP, tP, options in sourceFromTo
+            ]
+            if not sourceFromTo: return LocalTarget.Container(())
+            # Builds share the directory, so each writes its own file list
+            listName = f'.compile-{buildName}.json'
+            with open(buildPath / listName, 'w') as listFile:
+                json.dump(sourceFromTo, listFile)
+            operation, kwargs = (
+                ('from py_compile import compile', "{'optimize': optimize}")
+                if self._precompile
+                else ('from shutil import copy', '{}')
             )
             args = [
                 'python', '-B', '-c',
                 f'''
+import json
 import pathlib
 {operation} as operation
-from {moduleName} import sourceFromTo
 path = pathlib.Path('{moduleName}')
-for _, fromPath, toPath in sourceFromTo:
-    operation(path / fromPath, path / toPath)
+with open(path / {listName!r}) as listFile:
+    sourceFromTo = json.load(listFile)
+for _, fromPath, toPath, optimize in sourceFromTo:
+    operation(path / fromPath, path / toPath, **{kwargs})
     print('%s -> %s' % (fromPath, toPath))
 ''',
             ]
@@ -329,31 +1000,70 @@ for _, fromPath, toPath in sourceFromTo:
                 },
             }
             return DockerMode.Container(
-                self.type, f'{self.type}-build', args, **kwargs,
-            ) 
+                self.type,
+                DockerMode.getName(f'{self.type}-build', buildPath / buildName),
+                args,
+                removes=(buildPath / listName, ),
+                **kwargs,
+            )
         else:
-            return super().buildContainer(buildPath, sourceFromTo)
+            return super().buildContainer(buildPath, sourceFromTo, buildName)
 
-    def install(self, path, isQuiet=False):
+    def install(self, path, isQuiet=False, callback=print):
         pass
 
-    def run(self, path, isSilent=False):
+    @staticmethod
+    def _stream(container, chunks, isSilent, output):
+        if output:
+            output(''.join(chunks))
+        elif isSilent:
+            for _ in chunks: pass
+        else:
+            for chunk in chunks: print(chunk, end='')
+            print()
+        return container.status()
+
+    def run(self, path, isSilent=False, output=None):
         containerPath = '/flash'
         args = (
             ['python', '-u', 'main.pyc'] if self._type == 'cpython'
             else ['micropython', '-m', 'main']
         )
-        volumes = {
-            f'{path}': {'bind': containerPath, 'mode': 'rw'},
-        }
-        with DockerMode.Container(
+        if self._warm:
+            status = self._runWarm(path, args, isSilent, output)
+        else:
+            volumes = {
+                f'{path}': {'bind': containerPath, 'mode': self._runMode},
+            }
+            with DockerMode.Container(
+                    self._type,
+                    DockerMode.getName(f'{self._type}-run', path),
+                    args,
+                    autoRemove=False,
+                    volumes=volumes,
+                    working_dir=containerPath,
+            ) as container:
+                status = DockerTarget._stream(
+                    container, container.logs(stream=True), isSilent, output,
+                )
+        if status:
+            raise subprocess.CalledProcessError(status, args)
+
+    def _runWarm(self, path, args, isSilent, output):
+        # One container per install path, which it sees at /flash with the
+        # image's environment, exactly as a cold run does
+        containerPath = '/flash'
+        with DockerMode.WarmContainer(
                 self._type,
-                f'{self._type}-run',
-                args,
-                volumes=volumes,
-                working_dir=containerPath,
+                DockerMode.WarmContainer.getName(
+                    self._type, f'{path}@{self._name}:{self._runMode}'
+                ),
+                self._warm,
+                {f'{path}': {'bind': containerPath, 'mode': self._runMode}},
         ) as container:
-            for output in container.logs(stream=True):
-                if not isSilent: print(output, end='')
-            if not isSilent: print()
-            
+            return DockerTarget._stream(
+                container,
+                container.execute(args, containerPath),
+                isSilent,
+                output,
+            )
@@ -0,0 +1,86 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/trace.py
+####
+#### synopsis:  Record timed spans and export them as Chrome trace events
+####
+#### description:
+####
+####    Load the written file in Perfetto or chrome://tracing. Spans are
+####    not recorded until Trace.start(), so tracing is free by default.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import json
+import os
+import threading
+import time
+
+class _NullSpan:
+
+    def __enter__(self): return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback): pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+
+    def __init__(self, events, name, category, args):
+        self._events = events
+        self._name = name
+        self._category = category
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        end = time.perf_counter()
+        event = {
+            'name': self._name,
+            'cat': self._category,
+            'ph': 'X',
+            'ts': (self._start - Trace._epoch) * 1e6,
+            'dur': (end - self._start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        }
+        if self._args: event['args'] = {k: str(v) for k, v in self._args.items()}
+        if exc_type: event.setdefault('args', {})['error'] = exc_type.__name__
+        self._events.append(event)
+
+class Trace:
+
+    _events = None
+    _epoch = 0.0
+
+    @classmethod
+    def start(cls):
+        cls._events = []
+        cls._epoch = time.perf_counter()
+
+    @classmethod
+    def isEnabled(cls): return cls._events is not None
+
+    @classmethod
+    def span(cls, name, category='mupy', **args):
+        if cls._events is None: return _NULL_SPAN
+        return _Span(cls._events, name, category, args)
+
+    @classmethod
+    def write(cls, path):
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+             'args': {'name': 'mupy'}},
+        ] + list(cls._events or ())
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
@@ -0,0 +1,303 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      mupy/webrepl.py
+####
+#### synopsis:  Install and run over MicroPython's WebREPL
+####
+#### description:
+####
+####    A minimal websocket client and the WebREPL file protocol. File
+####    puts are pipelined: up to 'window' files are sent before their
+####    acknowledgements are read, all over a single session. Directories
+####    are made and main is run through the raw REPL, whose end markers
+####    cannot be mistaken for program output.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import base64
+import os
+import pathlib
+import socket
+import struct
+
+PORT = 8266
+WINDOW = 4
+
+_PUT = 1
+_GET = 2
+_REQUEST = '<2sBBQLH64s'
+_RESPONSE = '<2sH'
+_NAME = 64
+_CHUNK = 1024
+_PROMPT = '>>> '
+_RAW = 'raw REPL; CTRL-B to exit\r\n>'
+_RAW_OK = 'OK'
+_RAW_END = '\x04'
+_RAW_PROMPT = '>'
+
+_TEXT = 0x1
+_BINARY = 0x2
+_CLOSE = 0x8
+_PING = 0x9
+_PONG = 0xA
+
+class WebREPLError(OSError): pass
+
+def address(host, port=PORT):
+    # 'host' or 'host:port'
+    name, _, number = str(host).rpartition(':')
+    return (name, int(number)) if name and number.isdigit() else (str(host), port)
+
+class Session:
+
+    def __init__(self, host, port=PORT, password='', timeout=10.0, window=WINDOW):
+        self._address = address(host, port)
+        self._password = password
+        self._timeout = timeout
+        self._window = max(1, window)
+        self._socket = None
+        self._buffer = b''
+        self._text = ''
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def open(self):
+        self._socket = socket.create_connection(self._address, self._timeout)
+        try:
+            self._handshake()
+            self._readText(('Password: ', ))
+            self._sendText(f'{self._password}\r\n')
+            text = self._readText((_PROMPT, 'Access denied\r\n'))
+            if 'Access denied' in text:
+                raise WebREPLError(f'WebREPL password rejected by {self._address[0]}')
+            self._sendText('\x01')
+            self._readText((_RAW, ))
+        except BaseException:
+            self._socket.close()
+            self._socket = None
+            raise
+
+    def close(self):
+        if self._socket:
+            try:
+                # Leave the friendly REPL for whoever connects next
+                self._sendText('\x02')
+                self._send(b'', _CLOSE)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+
+    def _handshake(self):
+        host, port = self._address
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        self._socket.sendall((
+            f'GET / HTTP/1.1\r\nHost: {host}:{port}\r\n'
+            'Connection: Upgrade\r\nUpgrade: websocket\r\n'
+            f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n'
+            f'Origin: http://{host}\r\n\r\n'
+        ).encode('ascii'))
+        response = b''
+        while b'\r\n\r\n' not in response:
+            data = self._socket.recv(1024)
+            if not data: raise WebREPLError('WebREPL closed during handshake')
+            response += data
+        response, _, self._buffer = response.partition(b'\r\n\r\n')
+        if b' 101 ' not in response.split(b'\r\n', 1)[0]:
+            raise WebREPLError(f'WebREPL handshake failed: {response[:64]!r}')
+
+    def _recvExactly(self, size):
+        # The handshake may have read the start of the first frame
+        chunks = [self._buffer[:size]]
+        size -= len(chunks[0])
+        self._buffer = self._buffer[len(chunks[0]):]
+        while size:
+            data = self._socket.recv(min(size, 65536))
+            if not data: raise WebREPLError('WebREPL connection closed')
+            chunks.append(data)
+            size -= len(data)
+        return b''.join(chunks)
+
+    def _send(self, data, opcode):
+        # Clients must mask every frame
+        size = len(data)
+        header = bytearray([0x80 | opcode])
+        if size < 126:
+            header.append(0x80 | size)
+        elif size < 65536:
+            header.append(0x80 | 126)
+            header += struct.pack('>H', size)
+        else:
+            header.append(0x80 | 127)
+            header += struct.pack('>Q', size)
+        mask = os.urandom(4)
+        masked = (
+            int.from_bytes(data, 'big')
+            ^ int.from_bytes((mask * (size // 4 + 1))[:size], 'big')
+        ).to_bytes(size, 'big')
+        self._socket.sendall(bytes(header) + mask + masked)
+
+    def _sendText(self, text): self._send(text.encode('utf-8'), _TEXT)
+
+    def _receive(self):
+        payload = b''
+        kind = None
+        while True:
+            first, second = self._recvExactly(2)
+            opcode = first & 0x0F
+            size = second & 0x7F
+            if size == 126: size = struct.unpack('>H', self._recvExactly(2))[0]
+            elif size == 127: size = struct.unpack('>Q', self._recvExactly(8))[0]
+            mask = self._recvExactly(4) if second & 0x80 else None
+            data = self._recvExactly(size)
+            if mask:
+                data = bytes([b ^ mask[i % 4] for i, b in enumerate(data)])
+            if opcode == _CLOSE:
+                raise WebREPLError('WebREPL closed the connection')
+            if opcode == _PING:
+                self._send(data, _PONG)
+                continue
+            if opcode == _PONG: continue
+            if opcode: kind = opcode
+            payload += data
+            if first & 0x80: return kind, payload
+
+    def _readText(self, endings, output=None):
+        # Text frames until one of the endings; binary frames are ignored
+        while not any([self._text.endswith(e) for e in endings]):
+            kind, payload = self._receive()
+            if kind != _TEXT: continue
+            text = payload.decode('utf-8', 'replace')
+            self._text += text
+            if output: output(text)
+        text, self._text = self._text, ''
+        return text
+
+    def _readResponse(self, name):
+        while True:
+            kind, payload = self._receive()
+            if kind == _BINARY: break
+            self._text += payload.decode('utf-8', 'replace')
+        signature, code = struct.unpack(_RESPONSE, payload[:4])
+        if signature != b'WB' or code != 0:
+            raise WebREPLError(f"WebREPL refused '{name}' with status {code}")
+
+    def _readRaw(self, output=None):
+        # 'OK', the output, the end marker, any error, the end marker and
+        # the raw prompt; returns the output and the error
+        text, self._text = self._text, ''
+        shown = 0
+        while True:
+            _, isOk, body = text.partition(_RAW_OK)
+            out, isOut, rest = body.partition(_RAW_END)
+            error, isError, prompt = rest.partition(_RAW_END)
+            visible = out + error if isOk else ''
+            if output and visible[shown:]: output(visible[shown:])
+            shown = len(visible)
+            if isError and prompt.startswith(_RAW_PROMPT):
+                self._text = prompt[len(_RAW_PROMPT):]
+                return visible
+            kind, payload = self._receive()
+            if kind == _TEXT: text += payload.decode('utf-8', 'replace')
+
+    def execute(self, code, output=None):
+        # Returns the output, followed by any traceback
+        self._sendText(code + _RAW_END)
+        return self._readRaw(output)
+
+    def interrupt(self): self._sendText('\x03')
+
+    def put(self, files, callback=lambda line: None):
+        # files: (localPath, remoteName); acknowledgements trail the sends
+        pending = []
+        def acknowledge():
+            name = pending.pop(0)
+            self._readResponse(name)
+            self._readResponse(name)
+            callback(name)
+        for localPath, remoteName in files:
+            encoded = remoteName.encode('utf-8')
+            if len(encoded) > _NAME:
+                raise WebREPLError(f"WebREPL file name too long '{remoteName}'")
+            size = os.path.getsize(localPath)
+            request = struct.pack(
+                _REQUEST, b'WA', _PUT, 0, 0, size, len(encoded), encoded,
+            )
+            self._send(request, _BINARY)
+            with open(localPath, 'rb') as file:
+                while True:
+                    data = file.read(_CHUNK)
+                    if not data: break
+                    self._send(data, _BINARY)
+            pending.append(remoteName)
+            if len(pending) >= self._window: acknowledge()
+        while pending: acknowledge()
+
+    def get(self, remoteName):
+        encoded = remoteName.encode('utf-8')
+        self._send(
+            struct.pack(_REQUEST, b'WA', _GET, 0, 0, 0, len(encoded), encoded),
+            _BINARY,
+        )
+        self._readResponse(remoteName)
+        data = b''
+        while True:
+            self._send(b'\x00', _BINARY)
+            kind, payload = self._receive()
+            size = struct.unpack('<H', payload[:2])[0]
+            if size == 0: break
+            # The data may follow the length in the same frame or in several
+            chunk = payload[2:]
+            while len(chunk) < size: chunk += self._receive()[1]
+            data += chunk[:size]
+        self._readResponse(remoteName)
+        return data
+
+    def makedirs(self, directories):
+        if not directories: return
+        self.execute(
+            'import os\n'
+            f'for d in {sorted(directories)!r}:\n'
+            ' try:\n'
+            '  os.mkdir(d)\n'
+            ' except OSError:\n'
+            '  pass\n'
+        )
+
+    def install(self, path, root='/', callback=lambda line: None):
+        path = pathlib.Path(path)
+        root = root.rstrip('/')
+        files = []
+        directories = set()
+        for directory, dirNames, fileNames in os.walk(path):
+            rDirectory = pathlib.Path(directory).relative_to(path)
+            if rDirectory.parts:
+                directories.add(f'{root}/{rDirectory.as_posix()}')
+            for fileName in fileNames:
+                files.append((
+                    pathlib.Path(directory) / fileName,
+                    f'{root}/{(rDirectory / fileName).as_posix()}',
+                ))
+        # Parents sort before their children
+        self.makedirs(directories)
+        self.put(files, callback)
+
+    def run(self, module='main', output=None):
+        return self.execute(
+            'import sys\n'
+            f'sys.modules.pop({module!r}, None)\n'
+            f'import {module}\n',
+            output,
+        )
@@ -0,0 +1,82 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      tests/test_forkserver.py
+####
+#### usage:     python -m pytest tests  (or python -m unittest discover tests)
+####
+#### synopsis:  Check that fork server runs import what cold runs do
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from mupy import forkserver
+
+@unittest.skipUnless(forkserver.isSupported(), 'fork server unsupported')
+class ShadowTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(os.path.realpath(self._directory.name))
+        self.path = self.root / 'install'
+        self.path.mkdir()
+        # A private socket directory, so the test starts its own server
+        runtime = self.root / 'runtime'
+        runtime.mkdir(mode=0o700)
+        self._environ = mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': str(runtime)})
+        self._environ.start()
+
+    def tearDown(self):
+        self._environ.stop()
+        self._directory.cleanup()
+
+    def runMain(self, isWarm):
+        outputPath = self.root / 'output'
+        if isWarm:
+            with open(outputPath, 'w') as output:
+                status = forkserver.run(
+                    self.path, self.path / 'main.py', output.fileno(), output.fileno(),
+                    idle=5,
+                )
+        else:
+            with open(outputPath, 'w') as output:
+                status = subprocess.run(
+                    (sys.executable, 'main.py'), cwd=self.path,
+                    stdout=output, stderr=subprocess.STDOUT,
+                ).returncode
+        self.assertEqual(status, 0, outputPath.read_text())
+        return outputPath.read_text()
+
+    def test_install_modules_shadow_preloads(self):
+        (self.path / 'json.py').write_text("SOURCE = 'app'\n")
+        (self.path / 'random').mkdir()
+        (self.path / 'random' / '__init__.py').write_text("SOURCE = 'app package'\n")
+        (self.path / 'main.py').write_text(
+            'import json\nimport random\nimport math\n'
+            'print(json.SOURCE, random.SOURCE, math.pi > 3)\n'
+        )
+        cold = self.runMain(isWarm=False)
+        self.assertEqual(cold, 'app app package True\n')
+        self.assertEqual(self.runMain(isWarm=True), cold)
+        # The server keeps its own preloads for the next run
+        (self.path / 'json.py').unlink()
+        (self.path / 'main.py').write_text('import json\nprint(json.dumps([1]))\n')
+        self.assertEqual(self.runMain(isWarm=True), '[1]\n')
+
+if __name__ == '__main__':
+    unittest.main()
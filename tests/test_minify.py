@@ -0,0 +1,86 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      tests/test_minify.py
+####
+#### usage:     python -m pytest tests  (or python -m unittest discover tests)
+####
+#### synopsis:  Check which annotations the minifier keeps
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import ast
+import pathlib
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from mupy import minify
+
+def _function(source, name):
+    return next(
+        node for node in ast.walk(ast.parse(source))
+        if isinstance(node, ast.FunctionDef) and node.name == name
+    )
+
+class AnnotationTest(unittest.TestCase):
+
+    def test_plain_functions_lose_annotations(self):
+        text = minify.minify('def f(a: int) -> int:\n    b: int = a\n    return b\n')
+        self.assertEqual(text, 'def f(a):\n    b = a\n    return b\n')
+
+    def test_viper_and_native_functions_keep_annotations(self):
+        source = (
+            'import micropython\n'
+            'from micropython import native\n'
+            '@micropython.viper\n'
+            'def f(buf: ptr8, n: int) -> int:\n'
+            '    """Sum"""\n'
+            '    total: int = 0\n'
+            '    return total\n'
+            '@native\n'
+            'def g(n: int) -> int:\n'
+            '    return n\n'
+        )
+        text = minify.minify(source)
+        viper = _function(text, 'f')
+        self.assertEqual([ast.unparse(a.annotation) for a in viper.args.args], ['ptr8', 'int'])
+        self.assertEqual(ast.unparse(viper.returns), 'int')
+        self.assertIn('total: int = 0', text)
+        self.assertNotIn('Sum', text)
+        self.assertEqual(ast.unparse(_function(text, 'g').returns), 'int')
+
+    def test_class_fields_keep_annotations(self):
+        source = (
+            'from dataclasses import dataclass\n'
+            '@dataclass\n'
+            'class Point:\n'
+            '    x: int\n'
+            '    y: int = 0\n'
+            '    def scaled(self, k: int) -> "Point":\n'
+            '        return Point(self.x * k, self.y * k)\n'
+        )
+        text = minify.minify(source)
+        self.assertIn('x: int\n', text)
+        self.assertIn('y: int = 0\n', text)
+        self.assertIn('def scaled(self, k):', text)
+        namespace = {}
+        exec(text, namespace)
+        self.assertEqual(namespace['Point'](1, 2).scaled(3), namespace['Point'](3, 6))
+
+    def test_viper_emit_keeps_every_annotation(self):
+        self.assertTrue(minify.isViper(('-X', 'emit=viper')))
+        self.assertTrue(minify.isViper(('-Xemit=viper', )))
+        self.assertFalse(minify.isViper(('-X', 'emit=native', '-O2')))
+        source = 'def f(a: int) -> int:\n    b: int\n    return a\n'
+        self.assertEqual(minify.minify(source, isAnnotation=True), source)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      tests/test_webrepl.py
+####
+#### usage:     python -m pytest tests  (or python -m unittest discover tests)
+####
+#### synopsis:  Exercise the WebREPL transport against a stand-in server
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from mupy import bootstrap
+from mupy import tag
+from mupy import target
+from mupy import webrepl
+
+_SERVER = pathlib.Path(__file__).resolve().parent / 'webrepl_server.py'
+_PASSWORD = 'secret'
+
+class _Server:
+
+    def __init__(self, root, *options):
+        self._process = subprocess.Popen(
+            (sys.executable, str(_SERVER), str(root), *options),
+            stdout=subprocess.PIPE, text=True,
+        )
+        self.host = f'127.0.0.1:{int(self._process.stdout.readline())}'
+
+    def session(self, **kwargs):
+        return webrepl.Session(self.host, password=_PASSWORD, timeout=5.0, **kwargs)
+
+    def close(self):
+        self._process.kill()
+        self._process.wait()
+        self._process.stdout.close()
+
+class WebREPLTestCase(unittest.TestCase):
+
+    OPTIONS = ()
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(os.path.realpath(self._directory.name))
+        (self.root / 'device').mkdir()
+        self.device = self.root / 'device'
+        self.server = _Server(self.device, *self.OPTIONS)
+
+    def tearDown(self):
+        self.server.close()
+        self._directory.cleanup()
+
+    def app(self, files):
+        path = self.root / 'install'
+        for name, text in files.items():
+            (path / name).parent.mkdir(parents=True, exist_ok=True)
+            (path / name).write_text(text)
+        return path
+
+    def crossTarget(self, **meta):
+        return target.CrossTarget(
+            'wifi', 'micropython', False, tag.TagRay.fromString(''),
+            {
+                'transport': 'webrepl', 'host': self.server.host,
+                'password': _PASSWORD, 'root': str(self.device), **meta,
+            },
+        )
+
+class SessionTest(WebREPLTestCase):
+
+    def test_execute(self):
+        with self.server.session() as session:
+            self.assertEqual(session.execute('print(6 * 7)'), '42\r\n')
+            self.assertEqual(
+                session.execute('for i in range(3):\n    print(i)\n'),
+                '0\r\n1\r\n2\r\n',
+            )
+            streamed = []
+            session.execute('print("x" * 20)', streamed.append)
+            self.assertEqual(''.join(streamed), 'x' * 20 + '\r\n')
+
+    def test_output_like_a_prompt(self):
+        # Only the raw REPL's end markers finish a command; the server
+        # sends output in pieces of seven, so the first ends like a prompt
+        with self.server.session() as session:
+            self.assertEqual(
+                session.execute('print("abc>>> ", end="")\nprint("more")'),
+                'abc>>> more\r\n',
+            )
+            self.assertEqual(
+                session.execute('print("OK>>> ")\nraise ValueError("late")'),
+                'OK>>> \r\nValueError: late\r\n',
+            )
+            self.assertEqual(session.execute('print(1)'), '1\r\n')
+
+    def test_password(self):
+        session = webrepl.Session(self.server.host, password='wrong', timeout=5.0)
+        with self.assertRaises(webrepl.WebREPLError):
+            session.open()
+
+    def test_install_and_run(self):
+        path = self.app({
+            'main.py': 'import lib.greet\nlib.greet.hello()\n',
+            'lib/greet.py': 'def hello(): print("hello from the device")\n',
+        })
+        names = []
+        with self.server.session() as session:
+            session.install(path, str(self.device), names.append)
+            output = session.run('main')
+        self.assertEqual(
+            sorted(names),
+            [f'{self.device}/lib/greet.py', f'{self.device}/main.py'],
+        )
+        self.assertEqual((self.device / 'lib' / 'greet.py').read_text(),
+                         (path / 'lib' / 'greet.py').read_text())
+        self.assertIn('hello from the device', output)
+
+    def test_get(self):
+        data = bytes(range(256)) * 3
+        (self.device / 'blob').write_bytes(data)
+        with self.server.session() as session:
+            self.assertEqual(session.get(f'{self.device}/blob'), data)
+            self.assertEqual(session.execute('print(1)'), '1\r\n')
+
+class WindowTest(WebREPLTestCase):
+
+    # The server acknowledges only after three puts, so a client that
+    # waits for each acknowledgement stalls and shows batches of one
+    OPTIONS = ('--hold', '3')
+
+    def test_windowed_puts(self):
+        path = self.app({f'm{i}.py': f'x = {i}\n' for i in range(6)})
+        with self.server.session(window=4) as session:
+            session.install(path, str(self.device))
+            batches = session.execute('print(_batches)')
+        self.assertEqual(batches.strip(), '[3, 3]')
+        self.assertEqual(
+            sorted([p.name for p in self.device.iterdir()]),
+            [f'm{i}.py' for i in range(6)],
+        )
+
+class CompressedInstallTest(WebREPLTestCase):
+
+    FILES = {
+        'main.py': 'print("compressed")\n' * 40,
+        'lib/big.py': 'VALUE = 1\n' * 60,
+        'tiny.py': '1',
+    }
+
+    def test_install(self):
+        path = self.app(CompressedInstallTest.FILES)
+        messages = []
+        self.crossTarget(compress=True).install(
+            path, isQuiet=True, callback=messages.append,
+        )
+        self.assertTrue(messages[0].startswith('Compressed install'))
+        self.assertEqual(len(messages), 1, messages)
+        for name, text in CompressedInstallTest.FILES.items():
+            self.assertEqual((self.device / name).read_text(), text)
+        self.assertFalse((self.device / f'{bootstrap.INFLATE_MODULE}.py').exists())
+        self.assertFalse((self.device / bootstrap.INFLATE_DIRECTORY / 'main.py.z').exists())
+
+    def test_unchanged_files_are_not_resent(self):
+        path = self.app(CompressedInstallTest.FILES)
+        target = self.crossTarget(compress=True)
+        target.install(path, callback=lambda line: None)
+        names = []
+        target.install(path, callback=names.append)
+        self.assertIn(f'{self.device}/{bootstrap.INFLATE_DIRECTORY}/manifest', names)
+        self.assertNotIn(f'{self.device}/{bootstrap.INFLATE_DIRECTORY}/main.py.z', names)
+        (self.device / 'main.py').unlink()
+        messages = []
+        target.install(path, isQuiet=True, callback=messages.append)
+        self.assertIn('sending all', ' '.join(messages))
+        self.assertEqual((self.device / 'main.py').read_text(),
+                         CompressedInstallTest.FILES['main.py'])
+
+class UnsupportedFirmwareTest(WebREPLTestCase):
+
+    OPTIONS = ('--no-deflate', )
+
+    def test_falls_back_to_plain_files(self):
+        path = self.app(CompressedInstallTest.FILES)
+        messages = []
+        self.crossTarget(compress=True).install(
+            path, isQuiet=True, callback=messages.append,
+        )
+        self.assertIn('unsupported by the firmware', messages[-1])
+        for name, text in CompressedInstallTest.FILES.items():
+            self.assertEqual((self.device / name).read_text(), text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,279 @@
+##############################################################################
+##############################################################################
+##############################################################################
+##############################################################################
+####
+#### name:      tests/webrepl_server.py
+####
+#### usage:     python tests/webrepl_server.py ROOT [options]
+####
+#### synopsis:  A stand-in MicroPython WebREPL for the transport tests
+####
+#### description:
+####
+####    Serves one connection at a time on 127.0.0.1 and prints its port.
+####    It speaks the websocket handshake, the password prompt, a line
+####    REPL that echoes and prompts like the device, the raw REPL, and
+####    the put and get file opcodes. Device paths are host paths under ROOT, so
+####    clients set their install root to ROOT. A 'deflate' module stands
+####    in for the firmware's unless --no-deflate is given. Code run on
+####    the REPL sees '_batches', the number of puts received before each
+####    release of held acknowledgements.
+####
+#### copyright: (c) 2020 nbyoung@nbyoung.com
+####
+#### license:   MIT License
+####            https://mit-license.org/
+####
+
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import os
+import select
+import socket
+import struct
+import sys
+import types
+import zlib
+
+_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_REQUEST = '<2sBBQLH64s'
+_OK = b'WB\0\0'
+_PROMPT = b'>>> '
+_RAW = b'raw REPL; CTRL-B to exit\r\n>'
+_PUT = 1
+_GET = 2
+_TEXT = 0x1
+_BINARY = 0x2
+_CLOSE = 0x8
+
+class _DeflateIO:
+
+    def __init__(self, file, format):
+        self._file = file
+        self._decompressor = zlib.decompressobj(10)
+        self._data = b''
+
+    def read(self, size):
+        while len(self._data) < size:
+            data = self._file.read(64)
+            if not data:
+                self._data += self._decompressor.flush()
+                break
+            self._data += self._decompressor.decompress(data)
+        data, self._data = self._data[:size], self._data[size:]
+        return data
+
+class _Connection:
+
+    def __init__(self, connection, root, password, hold, chunk):
+        self._connection = connection
+        self._root = root
+        self._password = password
+        self._hold = hold
+        self._chunk = chunk
+        self._held = []
+        self._batches = []
+        self._namespace = {'_batches': self._batches}
+        self._line = ''
+        # Code typed into the raw REPL, or None in the line REPL
+        self._code = None
+
+    def _recvExactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._connection.recv(size - len(data))
+            if not chunk: raise EOFError()
+            data += chunk
+        return data
+
+    def _receive(self):
+        first, second = self._recvExactly(2)
+        size = second & 0x7F
+        if size == 126: size = struct.unpack('>H', self._recvExactly(2))[0]
+        elif size == 127: size = struct.unpack('>Q', self._recvExactly(8))[0]
+        mask = self._recvExactly(4)
+        data = self._recvExactly(size)
+        return first & 0x0F, bytes([b ^ mask[i % 4] for i, b in enumerate(data)])
+
+    def _send(self, data, opcode):
+        size = len(data)
+        header = bytes([0x80 | opcode]) + (
+            bytes([size]) if size < 126 else bytes([126]) + struct.pack('>H', size)
+        )
+        self._connection.sendall(header + data)
+
+    def _acknowledge(self, isFlush=False):
+        # Held acknowledgements go out once enough puts arrive or input stops
+        if not self._held: return
+        if not isFlush and len(self._held) < self._hold:
+            if select.select([self._connection], [], [], 0.2)[0]: return
+        self._batches.append(len(self._held))
+        for _ in self._held:
+            self._send(_OK, _BINARY)
+            self._send(_OK, _BINARY)
+        self._held = []
+
+    def _path(self, name):
+        path = os.path.normpath(name)
+        if os.path.commonpath([path, self._root]) != self._root:
+            raise PermissionError(name)
+        return path
+
+    def _handshake(self):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            data = self._connection.recv(1024)
+            if not data: raise EOFError()
+            request += data
+        key = next(
+            line.split(b':', 1)[1].strip() for line in request.split(b'\r\n')
+            if line.lower().startswith(b'sec-websocket-key:')
+        )
+        accept = base64.b64encode(hashlib.sha1(key + _GUID).digest())
+        self._connection.sendall(
+            b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+            b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n'
+            # Real devices may send the prompt with the handshake
+            + bytes([0x80 | _TEXT, 10]) + b'Password: '
+        )
+        _, password = self._receive()
+        if password.decode('utf-8').strip() != self._password:
+            self._send(b'\r\nAccess denied\r\n', _TEXT)
+            return False
+        self._send(b'\r\nWebREPL connected\r\n' + _PROMPT, _TEXT)
+        return True
+
+    def _put(self, size, name):
+        data = b''
+        while len(data) < size: data += self._receive()[1]
+        path = self._path(name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        self._held.append(name)
+
+    def _get(self, name):
+        with open(self._path(name), 'rb') as file:
+            data = file.read()
+        self._send(_OK, _BINARY)
+        for offset in range(0, len(data), self._chunk):
+            chunk = data[offset:offset + self._chunk]
+            self._receive()
+            # The length and the data arrive as separate frames, the data
+            # split in two, as a device writing through a small buffer does
+            self._send(struct.pack('<H', len(chunk)), _BINARY)
+            half = len(chunk) // 2 or len(chunk)
+            self._send(chunk[:half], _BINARY)
+            if chunk[half:]: self._send(chunk[half:], _BINARY)
+        self._receive()
+        self._send(struct.pack('<H', 0), _BINARY)
+        self._send(_OK, _BINARY)
+
+    def _run(self, code, mode):
+        output = io.StringIO()
+        error = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            try:
+                exec(compile(code, '<stdin>', mode), self._namespace)
+            except Exception as exception:
+                print(f'{type(exception).__name__}: {exception}', file=error)
+        return [
+            text.getvalue().replace('\n', '\r\n').encode('utf-8')
+            for text in (output, error)
+        ]
+
+    def _sendPieces(self, text):
+        # Output arrives in small pieces, as it does from a device
+        for offset in range(0, len(text), 7):
+            self._send(text[offset:offset + 7], _TEXT)
+
+    def _execute(self, line):
+        self._send(line.encode('utf-8') + b'\r\n', _TEXT)
+        output, error = self._run(line, 'single')
+        self._sendPieces(output + error)
+        self._send(_PROMPT, _TEXT)
+
+    def _executeRaw(self, code):
+        self._send(b'OK', _TEXT)
+        output, error = self._run(code, 'exec')
+        self._sendPieces(output + b'\x04' + error + b'\x04>')
+
+    def _type(self, text):
+        for character in text:
+            if character == '\x01':
+                self._code = ''
+                self._send(b'\r\n' + _RAW, _TEXT)
+            elif character == '\x02':
+                self._code = None
+                self._send(b'\r\nMicroPython stand-in\r\n' + _PROMPT, _TEXT)
+            elif character == '\x03':
+                if self._code is not None: self._code = ''
+                self._line = ''
+            elif self._code is not None:
+                if character == '\x04':
+                    code, self._code = self._code, ''
+                    self._executeRaw(code)
+                else:
+                    self._code += character
+            elif character in '\r\n':
+                line, self._line = self._line, ''
+                if line: self._execute(line)
+            else:
+                self._line += character
+
+    def serve(self):
+        if not self._handshake(): return
+        while True:
+            self._acknowledge()
+            try:
+                opcode, data = self._receive()
+            except EOFError:
+                return
+            if opcode == _CLOSE: return
+            if opcode == _BINARY and data[:2] == b'WA':
+                _, kind, _, _, size, length, name = struct.unpack(_REQUEST, data)
+                name = name[:length].decode('utf-8')
+                if kind == _PUT:
+                    self._put(size, name)
+                elif kind == _GET:
+                    self._acknowledge(isFlush=True)
+                    self._get(name)
+            elif opcode == _TEXT:
+                self._acknowledge(isFlush=True)
+                self._type(data.decode('utf-8'))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('root')
+    parser.add_argument('--password', default='secret')
+    parser.add_argument('--hold', type=int, default=1,
+                        help='Hold put acknowledgements until this many puts')
+    parser.add_argument('--chunk', type=int, default=5,
+                        help='Bytes per get data frame')
+    parser.add_argument('--no-deflate', action='store_true')
+    args = parser.parse_args()
+    root = os.path.realpath(args.root)
+    if not args.no_deflate:
+        sys.modules['deflate'] = types.SimpleNamespace(DeflateIO=_DeflateIO, ZLIB=1)
+    os.chdir(root)
+    sys.path.insert(0, root)
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    print(listener.getsockname()[1], flush=True)
+    while True:
+        connection, _ = listener.accept()
+        with connection:
+            try:
+                _Connection(
+                    connection, root, args.password, args.hold, args.chunk,
+                ).serve()
+            except (EOFError, OSError):
+                pass
+
+if __name__ == '__main__':
+    main()